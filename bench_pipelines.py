@@ -0,0 +1,344 @@
+# bench_pipelines.py
+"""
+Offline throughput benchmark for the filter and debate pipelines.
+
+Starts a deterministic mock OpenAI-compatible chat server on localhost, points
+llm_client / local_llm / gpt4o_client at it, and runs each pipeline over
+synthetic datasets of several sizes.  Replies are derived from a hash of the
+prompt, so every run sees the same decisions; latency, generation speed and
+failure rate are configurable.
+
+Results (examples/sec, requests, tokens/sec, failures) are written as JSON to
+bench_results/ tagged with the current git commit, so runs can be compared
+across commits:
+
+    python bench_pipelines.py --sizes 10 100 1000 --latency 0.02 --tps 400
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# === CONFIG ===
+RESULTS_DIR = "bench_results"
+DEFAULT_SIZES = [10, 100, 1000]
+DEBATE_CONTROLLER_RUNS = 5
+CHARS_PER_TOKEN = 4
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# --------------------------------------------------------------------------- #
+#  Mock server
+# --------------------------------------------------------------------------- #
+class MockLLMServer:
+    """Threaded mock of /v1/chat/completions with simulated latency and failures."""
+
+    def __init__(self, latency=0.02, tokens_per_sec=400.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset_stats()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/v1/chat/completions"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def reset_stats(self):
+        self.stats = {"requests": 0, "failures": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # ---- deterministic replies ------------------------------------------- #
+    @staticmethod
+    def _draw(prompt, salt=""):
+        digest = hashlib.sha256((salt + prompt).encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "little") / 2 ** 64
+
+    def reply_for(self, prompt):
+        r = self._draw(prompt)
+        match = re.search(r"JSON array of (\d+) integers", prompt)
+        if match:
+            count = int(match.group(1))
+            return json.dumps([1 + int(self._draw(prompt, str(i)) * 10) for i in range(count)])
+        match = re.search(r"JSON array of (\d+) objects", prompt)
+        if match:
+            count = int(match.group(1))
+            return json.dumps([{
+                "decision": "ACCEPT" if self._draw(prompt, str(i)) < 0.8 else "REJECT",
+                "confidence": round(0.5 + self._draw(prompt, f"c{i}") / 2, 2),
+                "justification": "Synthetic benchmark justification."
+            } for i in range(count)])
+        if "DECISION: [ACCEPT|REJECT]" in prompt:
+            decision = "ACCEPT" if r < 0.8 else "REJECT"
+            return (f"DECISION: {decision}\nCONFIDENCE: {0.5 + r / 2:.2f}\n"
+                    "JUSTIFICATION: Synthetic benchmark justification.")
+        if "YES or NO" in prompt or "yes/no" in prompt:
+            return "The example is usable. YES" if r < 0.7 else "The example is flawed. NO"
+        if "number" in prompt:
+            return str(1 + int(r * 10))
+        if '{"status": "ok"}' in prompt:
+            return '{"status": "ok"}'
+        if "Candidate A" in prompt:
+            return "def generated():\n    return 42\n"
+        return "def candidate():\n    return 42\n"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                messages = body.get("messages") or [{}]
+                prompt = messages[-1].get("content") or ""
+                if not isinstance(prompt, str):
+                    prompt = json.dumps(prompt)
+                with server._lock:
+                    failed = server._rng.random() < server.failure_rate
+                    server.stats["requests"] += 1
+                if failed:
+                    time.sleep(server.latency)
+                    with server._lock:
+                        server.stats["failures"] += 1
+                    self._send(500, {"error": "injected failure"})
+                    return
+
+                reply = server.reply_for(prompt)
+                prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // CHARS_PER_TOKEN
+                completion_tokens = max(1, len(reply) // CHARS_PER_TOKEN)
+                time.sleep(server.latency + completion_tokens / server.tokens_per_sec)
+                with server._lock:
+                    server.stats["prompt_tokens"] += prompt_tokens
+                    server.stats["completion_tokens"] += completion_tokens
+                self._send(200, {
+                    "id": "bench",
+                    "object": "chat.completion",
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": reply}}],
+                    "usage": {"prompt_tokens": prompt_tokens,
+                              "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens}
+                })
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+# --------------------------------------------------------------------------- #
+#  Synthetic data
+# --------------------------------------------------------------------------- #
+_TOPICS = ["list files", "install numpy", "reverse a list", "parse JSON", "restart nginx",
+           "count lines in a file", "create a virtualenv", "find large files"]
+
+
+def write_synthetic_dataset(path, size, seed=0):
+    """Mostly plausible pairs plus a slice of junk the prefilter should catch."""
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for i in range(size):
+            topic = rng.choice(_TOPICS)
+            roll = rng.random()
+            if roll < 0.05:
+                response = ""
+            elif roll < 0.10:
+                response = f"[ShellError] {topic}: command failed"
+            elif roll < 0.13:
+                response = '{"steps": ["' + topic
+            else:
+                response = f"To {topic}, run the usual command. " * rng.randint(1, 8)
+            f.write(json.dumps({
+                "instruction": f"How do I {topic}? (case {i})",
+                "response": response.strip(),
+                "metadata": {"source": rng.choice(["gpt", "memory"])}
+            }) + "\n")
+
+
+# --------------------------------------------------------------------------- #
+#  Pipelines
+# --------------------------------------------------------------------------- #
+def _run_training_filter(data, work, packed=False, prefilter=False):
+    import training_filter
+    training_filter.rank_and_filter_data(data, os.path.join(work, "scored.jsonl"),
+                                         ledger_path=os.path.join(work, "ledger.jsonl"),
+                                         packed=packed, prefilter=prefilter)
+
+
+def _run_debate_filter(data, work, packed=False, prefilter=False):
+    import debate_filter
+    debate_filter.debate_filter(data, os.path.join(work, "debated.jsonl"),
+                                ledger_path=os.path.join(work, "ledger.jsonl"), packed=packed,
+                                prefilter=prefilter)
+
+
+def _run_debate_filter_extended(data, work, packed=False, prefilter=False):
+    import debate_filter_extended
+    debate_filter_extended.debate_filter(data, os.path.join(work, "verified.jsonl"),
+                                         os.path.join(work, "unverified.jsonl"),
+                                         ledger_path=os.path.join(work, "ledger.jsonl"),
+                                         packed=packed, prefilter=prefilter)
+
+
+def _run_debate_controller(runs, work):
+    from debate_controller import DebateController
+    controller = DebateController()
+
+    async def go():
+        for i in range(runs):
+            await controller.run_debate(f"bench_module_{i}", "Write a function that returns 42.")
+
+    # run_debate writes to ../agi_system relative to the working directory
+    cwd = os.getcwd()
+    os.makedirs(os.path.join(work, "cwd"), exist_ok=True)
+    os.chdir(os.path.join(work, "cwd"))
+    try:
+        asyncio.run(go())
+    finally:
+        os.chdir(cwd)
+
+
+PIPELINES = {
+    "training_filter": lambda d, w: _run_training_filter(d, w),
+    "training_filter[packed]": lambda d, w: _run_training_filter(d, w, packed=True),
+    "training_filter[prefilter]": lambda d, w: _run_training_filter(d, w, prefilter=True),
+    "debate_filter": lambda d, w: _run_debate_filter(d, w),
+    "debate_filter[packed]": lambda d, w: _run_debate_filter(d, w, packed=True),
+    "debate_filter[prefilter]": lambda d, w: _run_debate_filter(d, w, prefilter=True),
+    "debate_filter_extended": lambda d, w: _run_debate_filter_extended(d, w),
+    "debate_filter_extended[packed]": lambda d, w: _run_debate_filter_extended(d, w, packed=True),
+    "debate_filter_extended[prefilter]":
+        lambda d, w: _run_debate_filter_extended(d, w, prefilter=True),
+}
+
+
+def _point_clients_at(url):
+    os.environ.setdefault("OPENAI_API_KEY", "bench-key")
+    import local_llm
+    local_llm.API_URL = url
+    # The async clients need aiohttp (and tiktoken for GPT-4o); pipelines that
+    # depend on them report an error in the results if they are missing.
+    for module_name in ("llm_client", "gpt4o_client"):
+        try:
+            module = __import__(module_name)
+            module.API_URL = url
+        except Exception as e:
+            print(f"[Bench] {module_name} unavailable: {e}")
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def _measure(server, name, size, fn):
+    server.reset_stats()
+    start = time.perf_counter()
+    error = None
+    try:
+        fn()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+    stats = dict(server.stats)
+    tokens = stats["prompt_tokens"] + stats["completion_tokens"]
+    result = {
+        "pipeline": name,
+        "size": size,
+        "seconds": round(elapsed, 4),
+        "examples_per_sec": round(size / elapsed, 3) if elapsed else None,
+        "tokens_per_sec": round(tokens / elapsed, 1) if elapsed else None,
+        "requests_per_example": round(stats["requests"] / size, 3) if size else None,
+        **stats,
+        "error": error,
+    }
+    print(f"[Bench] {name:<32} n={size:<6} {result['examples_per_sec']} ex/s  "
+          f"{result['tokens_per_sec']} tok/s  {stats['requests']} requests"
+          + (f"  ERROR {error}" if error else ""))
+    return result
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, pipelines=None, latency=0.02, tokens_per_sec=400.0,
+                   failure_rate=0.0, seed=0, debate_runs=DEBATE_CONTROLLER_RUNS,
+                   results_dir=RESULTS_DIR):
+    sys.path.insert(0, HERE)
+    server = MockLLMServer(latency, tokens_per_sec, failure_rate, seed).start()
+    _point_clients_at(server.url)
+    selected = pipelines or list(PIPELINES) + ["debate_controller"]
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in sizes:
+                data = os.path.join(tmp, f"synthetic_{size}.jsonl")
+                write_synthetic_dataset(data, size, seed)
+                for name in selected:
+                    if name not in PIPELINES:
+                        continue
+                    work = tempfile.mkdtemp(dir=tmp)
+                    results.append(_measure(server, name, size, lambda: PIPELINES[name](data, work)))
+            if "debate_controller" in selected and debate_runs:
+                work = tempfile.mkdtemp(dir=tmp)
+                results.append(_measure(server, "debate_controller", debate_runs,
+                                        lambda: _run_debate_controller(debate_runs, work)))
+    finally:
+        server.stop()
+
+    report = {
+        "commit": _git_commit(),
+        "created": datetime.now().isoformat(),
+        "config": {"sizes": list(sizes), "latency": latency, "tokens_per_sec": tokens_per_sec,
+                   "failure_rate": failure_rate, "seed": seed},
+        "results": results,
+    }
+    os.makedirs(results_dir, exist_ok=True)
+    out_path = os.path.join(results_dir, f"bench_{datetime.now():%Y%m%d%H%M%S}_{report['commit']}.json")
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[Bench] Results saved to: {out_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline pipeline throughput benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--pipelines", nargs="+", choices=list(PIPELINES) + ["debate_controller"])
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per request")
+    parser.add_argument("--tps", type=float, default=400.0, help="simulated tokens/sec")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--debate-runs", type=int, default=DEBATE_CONTROLLER_RUNS)
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    args = parser.parse_args()
+    run_benchmarks(args.sizes, args.pipelines, args.latency, args.tps, args.failure_rate,
+                   args.seed, args.debate_runs, args.results_dir)
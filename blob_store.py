@@ -0,0 +1,109 @@
+# blob_store.py
+"""
+Content-addressed blob store for large command outputs and file backups.
+
+A blob is stored once under its sha256 (of the uncompressed bytes) as
+``<root>/<first 2 hex>/<rest>.z``, zlib-compressed and written atomically, so
+backing up the same file content twice or logging the same huge output
+again costs nothing.  Logs keep only the hash, the size and a head/tail
+preview; get()/restore_file() bring the content back.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import zlib
+
+# === CONFIG ===
+BLOB_DIR = "blob_store"
+INLINE_MAX_BYTES = 4096     # outputs up to this size stay inline in the log
+PREVIEW_BYTES = 1024        # head and tail kept inline for larger outputs
+CHUNK = 1 << 20
+
+# Read once at import: os.umask() can only be queried by setting it, which is
+# not safe once executor threads are creating files
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+class BlobStore:
+    def __init__(self, root=BLOB_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:] + ".z")
+
+    def __contains__(self, digest: str) -> bool:
+        return os.path.exists(self.path_for(digest))
+
+    def _commit(self, digest, tmp_path):
+        final = self.path_for(digest)
+        if os.path.exists(final):
+            os.remove(tmp_path)   # already stored: dedup
+        else:
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            os.replace(tmp_path, final)
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self:
+            return digest
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(zlib.compress(data))
+        self._commit(digest, tmp)
+        return digest
+
+    def put_file(self, path: str):
+        """Stream *path* into the store; returns (digest, size)."""
+        hasher, compressor, size = hashlib.sha256(), zlib.compressobj(), 0
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as out, open(path, "rb") as src:
+            for chunk in iter(lambda: src.read(CHUNK), b""):
+                hasher.update(chunk)
+                size += len(chunk)
+                out.write(compressor.compress(chunk))
+            out.write(compressor.flush())
+        digest = hasher.hexdigest()
+        self._commit(digest, tmp)
+        return digest, size
+
+    def get(self, digest: str) -> bytes:
+        with open(self.path_for(digest), "rb") as f:
+            return zlib.decompress(f.read())
+
+    def restore_file(self, digest: str, dest: str):
+        """Write blob *digest* to *dest* atomically, keeping dest's permission bits."""
+        data = self.get(digest)
+        dirname = os.path.dirname(os.path.abspath(dest))
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix=".restore")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # mkstemp creates 0600; give the file the mode it had (or a normal umask mode)
+        if os.path.exists(dest):
+            shutil.copymode(dest, tmp)
+        else:
+            os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, dest)
+        return len(data)
+
+
+def preview_text(text: str, digest: str, size: int) -> str:
+    head = text[:PREVIEW_BYTES]
+    tail = text[-PREVIEW_BYTES:]
+    return f"{head}\n[... {size} bytes total, full output in blob {digest[:12]} ...]\n{tail}"
+
+
+def externalize(text: str, store: BlobStore):
+    """
+    Return (inline_text, blob_info) for a command output.  Small outputs come
+    back unchanged with blob_info None; large ones are stored and replaced by
+    a head/tail preview, with blob_info = {"blob": digest, "bytes": size}.
+    """
+    data = (text or "").encode("utf-8")
+    if len(data) <= INLINE_MAX_BYTES:
+        return text, None
+    digest = store.put(data)
+    return preview_text(text, digest, len(data)), {"blob": digest, "bytes": len(data)}
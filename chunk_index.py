@@ -0,0 +1,189 @@
+# chunk_index.py
+"""
+Chunk-level lexical retrieval over the files in a FileIndex.
+
+Text files are split into overlapping line windows.  Each chunk's text and
+line range live in the SQLite file next to the file index, and chunk text is
+ranked with the same BM25 InvertedIndex used for archived memory
+(memory_index.py), so queries support "phrases" and prefix* terms too.
+
+sync() compares each file's content hash against the hash it was chunked
+from, so only new or changed files are re-chunked.  Removed chunks are
+dropped from the index on load, and the postings file is rewritten once
+stale lines outnumber live ones.
+
+rerank() optionally asks the local LLM to reorder a short list of chunks;
+any failure keeps the BM25 order.
+"""
+
+import json
+import os
+import re
+import sqlite3
+
+from file_index import FILE_INDEX_DB
+from local_llm import call_local_model
+from memory_index import InvertedIndex
+
+# === CONFIG ===
+CHUNK_INDEX_FILE = "chunk_index.jsonl"
+CHUNK_LINES = 40
+CHUNK_OVERLAP = 10
+MAX_INDEX_BYTES = 2 * 1024 * 1024   # larger files are listed but not chunked
+BINARY_SNIFF_BYTES = 8192
+SNIPPET_CHARS = 800
+RERANK_SNIPPET_CHARS = 300
+
+RERANK_PROMPT = """You are a code-retrieval assistant. Given the user query: "{query}",
+rank the numbered snippets below by relevance and output a JSON list of the
+{top_k} most relevant snippet numbers, best first. Output only the JSON list.
+
+{snippets}
+"""
+
+
+def is_binary(path: str) -> bool:
+    with open(path, "rb") as f:
+        return b"\0" in f.read(BINARY_SNIFF_BYTES)
+
+
+def chunk_lines(lines, size=CHUNK_LINES, overlap=CHUNK_OVERLAP):
+    """Yield (start_line, end_line, text) windows; line numbers are 1-based, inclusive."""
+    step = max(1, size - overlap)
+    for start in range(0, max(len(lines), 1), step):
+        window = lines[start:start + size]
+        if not window:
+            break
+        yield start + 1, start + len(window), "".join(window)
+        if start + size >= len(lines):
+            break
+
+
+class ChunkIndex:
+    def __init__(self, file_index, db_path=FILE_INDEX_DB, index_path=CHUNK_INDEX_FILE):
+        self.files = file_index
+        self.base_dir = file_index.base_dir
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, base TEXT, path TEXT,
+                                               start_line INTEGER, end_line INTEGER, text TEXT);
+            CREATE INDEX IF NOT EXISTS chunks_by_path ON chunks (base, path);
+            CREATE TABLE IF NOT EXISTS chunked (base TEXT, path TEXT, sha256 TEXT,
+                                                PRIMARY KEY (base, path));
+        """)
+        self.index_path = index_path
+        self.index = InvertedIndex(index_path)
+        self._stale_lines = 0
+        live = {row[0] for row in self.db.execute("SELECT id FROM chunks")}
+        for doc_id in [d for d in self.index.doc_lengths if d not in live]:
+            self.index.remove(doc_id)
+            self._stale_lines += 1
+
+    # ---- building --------------------------------------------------------- #
+    def _drop(self, path):
+        ids = [row[0] for row in self.db.execute(
+            "SELECT id FROM chunks WHERE base = ? AND path = ?", (self.base_dir, path))]
+        for doc_id in ids:
+            self.index.remove(doc_id)
+        self._stale_lines += len(ids)
+        self.db.execute("DELETE FROM chunks WHERE base = ? AND path = ?", (self.base_dir, path))
+        self.db.execute("DELETE FROM chunked WHERE base = ? AND path = ?", (self.base_dir, path))
+
+    def _chunk_file(self, path, sha256):
+        full = os.path.join(self.base_dir, path)
+        try:
+            if os.path.getsize(full) > MAX_INDEX_BYTES or is_binary(full):
+                chunks = []
+            else:
+                with open(full, "r", errors="replace") as f:
+                    chunks = list(chunk_lines(f.readlines()))
+        except OSError:
+            return 0
+        for start, end, text in chunks:
+            cur = self.db.execute("INSERT INTO chunks (base, path, start_line, end_line, text) "
+                                  "VALUES (?, ?, ?, ?, ?)", (self.base_dir, path, start, end, text))
+            self.index.add(cur.lastrowid, {"file": path, "content": text})
+        self.db.execute("INSERT OR REPLACE INTO chunked VALUES (?, ?, ?)", (self.base_dir, path, sha256))
+        return len(chunks)
+
+    def sync(self):
+        """Re-chunk files whose content hash changed since they were last chunked; returns the count."""
+        self.files.refresh_if_stale()
+        current = {row[0]: row[1] for row in self.files.db.execute(
+            "SELECT path, sha256 FROM files WHERE base = ?", (self.base_dir,))}
+        chunked = {row[0]: row[1] for row in self.db.execute(
+            "SELECT path, sha256 FROM chunked WHERE base = ?", (self.base_dir,))}
+        updated = 0
+        with self.db:
+            for path in set(chunked) - set(current):
+                self._drop(path)
+                updated += 1
+            for path, sha256 in current.items():
+                if chunked.get(path) != sha256:
+                    if path in chunked:
+                        self._drop(path)
+                    self._chunk_file(path, sha256)
+                    updated += 1
+        if updated:
+            print(f"[ChunkIndex] Re-chunked {updated} changed/removed files ({len(self.index)} chunks indexed).")
+        if self._stale_lines > len(self.index):
+            self._rewrite()
+        return updated
+
+    def _rewrite(self):
+        """Rewrite the postings file with only the live chunks."""
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            for doc_id, length in self.index.doc_lengths.items():
+                terms = self.index.terms_of(doc_id)
+                f.write(json.dumps({"doc": doc_id, "len": length, "terms": terms}) + "\n")
+        os.replace(tmp, self.index_path)
+        self._stale_lines = 0
+
+    # ---- querying --------------------------------------------------------- #
+    def search(self, query: str, top_n=20):
+        """BM25 over chunk text; returns [{path, start_line, end_line, score, snippet}]."""
+        results = []
+        for doc_id, score in self.index.search(query, top_k=top_n * 2):
+            row = self.db.execute("SELECT path, start_line, end_line, text FROM chunks "
+                                  "WHERE id = ? AND base = ?", (doc_id, self.base_dir)).fetchone()
+            if row is None:
+                continue
+            path, start, end, text = row
+            results.append({"path": path, "start_line": start, "end_line": end,
+                            "score": round(score, 3), "snippet": text[:SNIPPET_CHARS]})
+            if len(results) >= top_n:
+                break
+        return results
+
+
+def _rerank_entry(i, hit):
+    head = f"[{i}] {hit['path']}:{hit['start_line']}-{hit['end_line']}"
+    if hit.get("file_summary"):
+        # A cached file summary says more per token than raw content
+        symbols = ", ".join(hit.get("symbols", [])[:10])
+        return (f"{head}\nFile: {hit['file_summary']}" + (f"\nSymbols: {symbols}" if symbols else "")
+                + f"\n{hit['snippet'][:RERANK_SNIPPET_CHARS // 2]}")
+    return f"{head}\n{hit['snippet'][:RERANK_SNIPPET_CHARS]}"
+
+
+def rerank(query, hits, top_k):
+    """Ask the local LLM to reorder *hits*; falls back to the given order."""
+    if len(hits) <= 1:
+        return hits[:top_k]
+    snippets = "\n\n".join(_rerank_entry(i, h) for i, h in enumerate(hits))
+    try:
+        reply = call_local_model(RERANK_PROMPT.format(query=query, top_k=top_k, snippets=snippets))
+        match = re.search(r"\[[\d,\s]*\]", reply)
+        order = json.loads(match.group(0)) if match else []
+    except Exception as e:
+        print(f"[ChunkIndex] Rerank failed, keeping BM25 order: {e}")
+        return hits[:top_k]
+    picked, seen = [], set()
+    for i in order:
+        if isinstance(i, int) and 0 <= i < len(hits) and i not in seen:
+            picked.append(hits[i])
+            seen.add(i)
+    # Fill up with BM25 order if the model returned fewer than top_k
+    picked += [h for i, h in enumerate(hits) if i not in seen]
+    return picked[:top_k]
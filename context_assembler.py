@@ -0,0 +1,206 @@
+# context_assembler.py
+"""
+Token-budgeted context for the GPT planning prompt.
+
+Candidate items (goals, memories, recent results, the tool manifest) are
+gathered from pluggable sources, each scored as
+
+    value = RELEVANCE_WEIGHT * relevance(query, item) + IMPORTANCE_WEIGHT * importance
+
+and packed greedily by value per token into a fixed budget.  Pinned items
+(e.g. the current goal) always go in first.  Per-kind limits keep any one
+source from crowding out the others (key_Concepts: "only top-3 memory
+summaries").  The prompt therefore stays bounded however much history piles up.
+
+A source may carry an ``on_selected(items)`` hook; assemble() calls it with
+the source's items that made it into the context (memory_source uses this to
+count recalls only for memories actually shown to GPT).
+"""
+
+import inspect
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import embeddings
+from memory_compactor import DEFAULT_CERTAINTY, DEFAULT_IMPORTANCE, entry_text
+
+try:
+    import tiktoken
+    _encoding = tiktoken.encoding_for_model("gpt-4o")
+except Exception:  # not installed, or no cached encoding offline
+    _encoding = None
+
+# === CONFIG ===
+DEFAULT_BUDGET = 3000          # key_Concepts: keep GPT input under ~2-4K tokens
+MAX_ITEM_TOKENS = 400          # longer items are truncated before packing
+RELEVANCE_WEIGHT = 0.6
+IMPORTANCE_WEIGHT = 0.4
+KIND_LIMITS = {"memory": 3, "goal": 5, "result": 5}
+SECTION_TITLES = {
+    "goal": "Goals",
+    "memory": "Relevant memory",
+    "result": "Recent results",
+    "tool": "Available tools",
+}
+
+
+def count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text)[:max_tokens]) + " …"
+    return text[:max_tokens * 4] + " …"
+
+
+@dataclass
+class ContextItem:
+    kind: str
+    text: str
+    importance: float = 0.5
+    pinned: bool = False
+    relevance: float = 0.0
+    tokens: int = 0
+    ref: Any = None                                 # the object the item was made from
+    origin: Any = field(default=None, repr=False)   # the source that produced it
+
+    @property
+    def value(self) -> float:
+        return RELEVANCE_WEIGHT * self.relevance + IMPORTANCE_WEIGHT * self.importance
+
+
+# === SOURCES ===
+# Each source is a callable (query) -> List[ContextItem].
+
+def goal_source(get_goals: Callable[[], str]):
+    def collect(query):
+        try:
+            goals = json.loads(get_goals())
+        except (ValueError, TypeError):
+            return []
+        items = []
+        for age, goal in enumerate(reversed(goals)):
+            text = goal.get("goals") if isinstance(goal, dict) else goal
+            if not text:
+                continue
+            items.append(ContextItem("goal", str(text), importance=0.9 / (1 + age),
+                                     pinned=(age == 0)))
+        return items
+    return collect
+
+
+def memory_source(archiver, top_k=10):
+    def collect(query):
+        return [ContextItem("memory", entry_text(mem),
+                            importance=mem.get("importance", DEFAULT_IMPORTANCE)
+                            * mem.get("certainty", DEFAULT_CERTAINTY), ref=mem)
+                for mem in archiver.search_memory(query, top_k=top_k, record=False)]
+
+    def on_selected(items):
+        # Only memories packed into the prompt count as recalled
+        archiver.record_recall([item.ref for item in items])
+    collect.on_selected = on_selected
+    return collect
+
+
+def result_source(feedback_logger, last_n=10):
+    def collect(query):
+        try:
+            lines = feedback_logger.summarize(last_n=last_n)
+        except Exception:
+            return []
+        # Newest results matter most
+        return [ContextItem("result", line, importance=0.8 / (1 + age))
+                for age, line in enumerate(reversed(lines))]
+    return collect
+
+
+def tool_source(registry: Dict[str, Callable]):
+    def collect(query):
+        items = []
+        for name, fn in registry.items():
+            doc = (inspect.getdoc(fn) or "").split("\n")[0]
+            try:
+                signature = str(inspect.signature(fn))
+            except (TypeError, ValueError):
+                signature = "(...)"
+            items.append(ContextItem("tool", f"{name}{signature}" + (f" - {doc}" if doc else ""),
+                                     importance=0.7))
+        return items
+    return collect
+
+
+class ContextAssembler:
+    def __init__(self, sources: List[Callable], budget: int = DEFAULT_BUDGET,
+                 kind_limits: Optional[Dict[str, int]] = None):
+        self.sources = sources
+        self.budget = budget
+        self.kind_limits = KIND_LIMITS if kind_limits is None else kind_limits
+
+    def collect(self, query: str) -> List[ContextItem]:
+        items = []
+        for source in self.sources:
+            try:
+                found = source(query)
+                for item in found:
+                    item.origin = source
+                items.extend(found)
+            except Exception as e:
+                print(f"[Context] Source {getattr(source, '__qualname__', source)} failed: {e}")
+        return items
+
+    def _score(self, query, items):
+        vectors = embeddings.embed_texts([query] + [item.text for item in items])
+        for item, vec in zip(items, vectors[1:]):
+            item.text = truncate_to_tokens(" ".join(item.text.split()), MAX_ITEM_TOKENS)
+            item.tokens = count_tokens(item.text) + 2   # "- " bullet and newline
+            item.relevance = max(0.0, embeddings.cosine(vectors[0], vec))
+
+    def select(self, query: str, items: List[ContextItem]) -> List[ContextItem]:
+        if not items:
+            return []
+        self._score(query, items)
+        chosen, used, per_kind, seen = [], 0, {}, set()
+        ranked = sorted(items, key=lambda i: (not i.pinned, -i.value / i.tokens))
+        for item in ranked:
+            if (item.kind, item.text) in seen:
+                continue
+            header = 0 if per_kind.get(item.kind) else count_tokens(f"## {SECTION_TITLES.get(item.kind, item.kind)}\n")
+            limit = self.kind_limits.get(item.kind)
+            if limit is not None and per_kind.get(item.kind, 0) >= limit and not item.pinned:
+                continue
+            if used + header + item.tokens > self.budget:
+                continue
+            chosen.append(item)
+            seen.add((item.kind, item.text))
+            used += header + item.tokens
+            per_kind[item.kind] = per_kind.get(item.kind, 0) + 1
+        return chosen
+
+    def assemble(self, query: str):
+        """Return (context_text, stats) for *query*, within the token budget."""
+        candidates = self.collect(query)
+        chosen = self.select(query, candidates)
+        sections = []
+        for kind in list(SECTION_TITLES) + sorted({i.kind for i in chosen} - set(SECTION_TITLES)):
+            lines = [f"- {item.text}" for item in chosen if item.kind == kind]
+            if lines:
+                sections.append(f"## {SECTION_TITLES.get(kind, kind)}\n" + "\n".join(lines))
+        text = "\n\n".join(sections)
+        for source in self.sources:
+            hook = getattr(source, "on_selected", None)
+            picked = [item for item in chosen if item.origin is source]
+            if hook is not None and picked:
+                try:
+                    hook(picked)
+                except Exception as e:
+                    print(f"[Context] on_selected for {getattr(source, '__qualname__', source)} failed: {e}")
+        stats = {"candidates": len(candidates), "selected": len(chosen),
+                 "tokens": count_tokens(text), "budget": self.budget}
+        return text, stats
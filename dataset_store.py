@@ -0,0 +1,304 @@
+# dataset_store.py
+"""
+Compact, indexed on-disk format for training datasets.
+
+A store named ``data`` is a handful of files:
+
+    data.rec          append-only record file (compact JSON, optionally zlib'd)
+    data.idx          fixed-width index: (offset, length) as two uint64 per record
+    data.col.<name>   one columnar side file per extracted field
+    data.meta.json    column types, categorical vocabularies, compression flag
+
+The index gives O(1) random access to record i, and the side files let us
+filter by score or verdict without decoding any record text.  Numeric columns
+are float64 (NaN when missing); categorical columns (e.g. "result") are int32
+codes into a vocabulary kept in the meta file (-1 when missing).
+
+Usage:
+    python dataset_store.py import scored_training_data.jsonl data/scored
+    python dataset_store.py export data/scored out.jsonl --min-score 7
+    python dataset_store.py stats data/scored
+"""
+
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+import zlib
+from array import array
+
+# === CONFIG ===
+DEFAULT_COLUMNS = {"score": "f", "final_score": "f", "score_a": "f", "score_b": "f",
+                   "result": "s", "source": "s"}
+_IDX = struct.Struct("<QQ")
+_TYPECODES = {"f": "d", "s": "i"}
+_MISSING = {"f": math.nan, "s": -1}
+
+
+def _paths(path):
+    return {
+        "rec": path + ".rec",
+        "idx": path + ".idx",
+        "meta": path + ".meta.json",
+    }
+
+
+def _column_path(path, name):
+    return f"{path}.col.{name}"
+
+
+def _field(record, name):
+    """Look a column up on the record itself, then in its metadata."""
+    if name in record:
+        return record[name]
+    metadata = record.get("metadata")
+    if isinstance(metadata, dict):
+        return metadata.get(name)
+    return None
+
+
+class DatasetWriter:
+    """
+    Appends records to a store, creating it if needed.
+    Reopening an existing store continues where it left off; a torn tail from
+    a crash (record written but index/columns not) is trimmed on open.  The
+    meta file is rewritten whenever a new vocabulary entry is assigned, before
+    any row using its code is written, so codes on disk are always known.
+    """
+    def __init__(self, path, columns=None, compress=False):
+        self.path = path
+        files = _paths(path)
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        created = not os.path.exists(files["meta"])
+        if created:
+            self.meta = {
+                "columns": dict(columns or DEFAULT_COLUMNS),
+                "vocab": {},
+                "compress": compress,
+            }
+        else:
+            with open(files["meta"], "r") as f:
+                self.meta = json.load(f)
+        self.columns = self.meta["columns"]
+        self.vocab = {name: {v: i for i, v in enumerate(self.meta["vocab"].get(name, []))}
+                      for name, kind in self.columns.items() if kind == "s"}
+        if created:
+            self._save_meta()
+
+        # Only rows present in the index and in every column survive a crash
+        self.count = os.path.getsize(files["idx"]) // _IDX.size if os.path.exists(files["idx"]) else 0
+        for name, kind in self.columns.items():
+            col = _column_path(path, name)
+            rows = os.path.getsize(col) // array(_TYPECODES[kind]).itemsize if os.path.exists(col) else 0
+            self.count = min(self.count, rows)
+        self._idx = open(files["idx"], "ab")
+        self._idx.truncate(self.count * _IDX.size)
+        end = 0
+        if self.count:
+            with open(files["idx"], "rb") as f:
+                f.seek((self.count - 1) * _IDX.size)
+                offset, length = _IDX.unpack(f.read(_IDX.size))
+                end = offset + length
+        self._rec = open(files["rec"], "ab")
+        self._rec.truncate(end)
+        self._rec.seek(0, os.SEEK_END)
+        self._cols = {}
+        for name, kind in self.columns.items():
+            fh = open(_column_path(path, name), "ab")
+            fh.truncate(self.count * array(_TYPECODES[kind]).itemsize)
+            self._cols[name] = fh
+
+    def _encode(self, name, kind, value):
+        if value is None:
+            return _MISSING[kind]
+        if kind == "f":
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return math.nan
+        codes = self.vocab[name]
+        value = str(value)
+        if value not in codes:
+            codes[value] = len(codes)
+            self._save_meta()
+        return codes[value]
+
+    def _save_meta(self):
+        """Atomically rewrite the meta file with the current vocabularies."""
+        self.meta["vocab"] = {name: sorted(codes, key=codes.get) for name, codes in self.vocab.items()}
+        meta_path = _paths(self.path)["meta"]
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def append(self, record) -> int:
+        """Append one record; returns its index."""
+        data = json.dumps(record, separators=(",", ":")).encode("utf-8")
+        if self.meta["compress"]:
+            data = zlib.compress(data)
+        offset = self._rec.tell()
+        self._rec.write(data)
+        self._idx.write(_IDX.pack(offset, len(data)))
+        for name, kind in self.columns.items():
+            value = self._encode(name, kind, _field(record, name))
+            self._cols[name].write(array(_TYPECODES[kind], [value]).tobytes())
+        self.count += 1
+        return self.count - 1
+
+    def close(self):
+        for fh in [self._rec, self._idx, *self._cols.values()]:
+            fh.close()
+        self._save_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DatasetReader:
+    """Random-access reader; record and index files are memory-mapped by default."""
+    def __init__(self, path, use_mmap=True):
+        self.path = path
+        files = _paths(path)
+        with open(files["meta"], "r") as f:
+            self.meta = json.load(f)
+        self.columns = self.meta["columns"]
+        self._files, self._maps = [], []
+        self._rec = self._open(files["rec"], use_mmap)
+        self._idx = self._open(files["idx"], use_mmap)
+        self.count = len(self._idx) // _IDX.size
+        self._column_cache = {}
+
+    def _open(self, filename, use_mmap):
+        fh = open(filename, "rb")
+        self._files.append(fh)
+        if use_mmap and os.path.getsize(filename):
+            mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps.append(mapped)
+            return mapped
+        return fh.read()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        offset, length = _IDX.unpack_from(self._idx, i * _IDX.size)
+        data = self._rec[offset:offset + length]
+        if self.meta["compress"]:
+            data = zlib.decompress(data)
+        return json.loads(data)
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def column(self, name):
+        """Whole column as an array ('d' floats or 'i' vocabulary codes)."""
+        if name not in self._column_cache:
+            values = array(_TYPECODES[self.columns[name]])
+            with open(_column_path(self.path, name), "rb") as f:
+                values.frombytes(f.read(self.count * values.itemsize))
+            self._column_cache[name] = values
+        return self._column_cache[name]
+
+    def vocabulary(self, name):
+        return self.meta["vocab"].get(name, [])
+
+    def where(self, name, min_value=None, max_value=None, equals=None):
+        """Indices whose column value matches, decided from the side file alone."""
+        values = self.column(name)
+        if self.columns[name] == "s":
+            vocab = self.vocabulary(name)
+            if equals not in vocab:
+                return []
+            code = vocab.index(equals)
+            return [i for i, v in enumerate(values) if v == code]
+        lo = -math.inf if min_value is None else min_value
+        hi = math.inf if max_value is None else max_value
+        return [i for i, v in enumerate(values) if lo <= v <= hi]
+
+    def close(self):
+        for mapped in self._maps:
+            mapped.close()
+        for fh in self._files:
+            fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def from_jsonl(jsonl_path, store_path, columns=None, compress=False):
+    with open(jsonl_path, "r") as f, DatasetWriter(store_path, columns, compress) as writer:
+        for line in f:
+            if line.strip():
+                writer.append(json.loads(line))
+        count = writer.count
+    print(f"[DatasetStore] Imported {jsonl_path} -> {store_path} ({count} records)")
+    return count
+
+
+def to_jsonl(store_path, jsonl_path, indices=None):
+    with DatasetReader(store_path) as reader, open(jsonl_path, "w") as out:
+        selected = range(len(reader)) if indices is None else indices
+        written = 0
+        for i in selected:
+            out.write(json.dumps(reader[i]) + "\n")
+            written += 1
+    print(f"[DatasetStore] Exported {written} records -> {jsonl_path}")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indexed dataset store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import")
+    imp.add_argument("jsonl")
+    imp.add_argument("store")
+    imp.add_argument("--compress", action="store_true")
+    exp = sub.add_parser("export")
+    exp.add_argument("store")
+    exp.add_argument("jsonl")
+    exp.add_argument("--min-score", type=float)
+    exp.add_argument("--result")
+    st = sub.add_parser("stats")
+    st.add_argument("store")
+    args = parser.parse_args()
+
+    if args.cmd == "import":
+        from_jsonl(args.jsonl, args.store, compress=args.compress)
+    elif args.cmd == "export":
+        indices = None
+        with DatasetReader(args.store) as reader:
+            if args.min_score is not None:
+                indices = set(reader.where("score", min_value=args.min_score))
+            if args.result is not None:
+                matched = set(reader.where("result", equals=args.result))
+                indices = matched if indices is None else indices & matched
+        to_jsonl(args.store, args.jsonl, None if indices is None else sorted(indices))
+    else:
+        with DatasetReader(args.store) as reader:
+            print(f"[DatasetStore] {args.store}: {len(reader)} records")
+            for name, kind in reader.columns.items():
+                values = reader.column(name)
+                if kind == "f":
+                    present = [v for v in values if not math.isnan(v)]
+                    if present:
+                        print(f"  {name}: {len(present)} values, mean {sum(present) / len(present):.2f}")
+                else:
+                    vocab = reader.vocabulary(name)
+                    counts = {vocab[c]: values.count(c) for c in set(values) if c >= 0}
+                    print(f"  {name}: {counts}")
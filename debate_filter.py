@@ -2,9 +2,18 @@ import json
 import os
 from datetime import datetime
 from local_llm import call_local_model
+from verdict_ledger import VerdictLedger, example_key
+from prefilter import ACCEPT_SCORE, resolve as resolve_prefilter
+from packed_scoring import (PACK_WINDOW, estimate_tokens, format_examples, iter_windows,
+                            ledger_version, plan_packs, plan_shared_packs, unpack_slots,
+                            valid_score)
 
 INPUT_FILE = "training_data.jsonl"
 OUTPUT_FILE = "debated_training_data.jsonl"
+LEDGER_FILE = "debate_filter_ledger.jsonl"
+
+# Bump when the scoring/judge prompts change so old verdicts are not reused.
+PROMPT_VERSION = "debate-v1"
 
 MODEL_A = "Mistral Instruct"
 MODEL_B = "Reasoner v1"
@@ -29,6 +38,42 @@ Give only the number.
     digits = [int(c) for c in reply if c.isdigit()]
     return max(digits) if digits else 1
 
+PACKED_SCORE_PROMPT = """
+Evaluate each of these {count} instruction-response pairs from 1 to 10:
+
+{examples}
+Return only a JSON array of {count} integers, one score per example, in order.
+"""
+
+def model_scores_packed(model, pairs):
+    """
+    Score many (instruction, response) pairs with packed prompts sized to the
+    model's context; malformed slots fall back to model_score().
+    """
+    scores = [None] * len(pairs)
+    overhead = estimate_tokens(PACKED_SCORE_PROMPT)
+    for pack in plan_packs(pairs, model, overhead, reply_tokens_per_item=4):
+        if len(pack) < 2:
+            continue
+        prompt = PACKED_SCORE_PROMPT.format(count=len(pack),
+                                            examples=format_examples([pairs[i] for i in pack]))
+        reply = call_local_model(prompt, model)
+        for i, score in zip(pack, unpack_slots(reply, len(pack), valid_score)):
+            scores[i] = score
+    return [score if score is not None else model_score(model, *pair)
+            for pair, score in zip(pairs, scores)]
+
+def iter_pair_scores_packed(pairs):
+    """
+    Yield (index, score_a, score_b) pack by pack.  Packs are sized for the
+    smaller of the two context windows so A and B score the same examples
+    and each verdict is complete as soon as its pack returns.
+    """
+    overhead = estimate_tokens(PACKED_SCORE_PROMPT)
+    for pack in plan_shared_packs(pairs, [MODEL_A, MODEL_B], overhead, reply_tokens_per_item=4):
+        subset = [pairs[i] for i in pack]
+        yield from zip(pack, model_scores_packed(MODEL_A, subset), model_scores_packed(MODEL_B, subset))
+
 def judge_disagreement(instruction, response, score_a, score_b):
     prompt = f"""
 Two models scored this instruction-response pair:
@@ -45,54 +90,89 @@ Should this example be included in a fine-tuning dataset? Justify your answer an
 """
     return call_local_model(prompt, JUDGE_MODEL)
 
-def debate_filter(input_path, output_path, agree_threshold=6):
+def debate_filter(input_path, output_path, agree_threshold=6, ledger_path=LEDGER_FILE,
+                  packed=False, prefilter=False):
     print("[DebateFilter] Starting debate filter...")
-    kept, skipped, debated = 0, 0, 0
-
-    with open(input_path, "r") as infile, open(output_path, "w") as outfile:
-        for line in infile:
-            example = json.loads(line)
-            instr, resp = example["instruction"], example["response"]
-
-            score_a = model_score(MODEL_A, instr, resp)
-            score_b = model_score(MODEL_B, instr, resp)
-
-            if score_a >= agree_threshold and score_b >= agree_threshold:
-                reason = "Both models agree it's good."
-                final_score = (score_a + score_b) // 2
-                result = "accepted"
+    cascade = resolve_prefilter(prefilter)
+    kept, skipped, debated, cached = 0, 0, 0, 0
+
+    with open(input_path, "r") as infile, open(output_path, "w") as outfile, \
+         VerdictLedger(ledger_path) as ledger:
+        version = ledger_version(PROMPT_VERSION, packed)
+        for window in iter_windows(infile, PACK_WINDOW if packed else 1):
+            # Clear cases are settled by the prefilter and never reach the models.
+            # The ledger keeps raw scores (and the judge reply, if one was
+            # needed), so a changed agree_threshold can still reuse them.
+            decisions = [cascade.classify(ex) if cascade else (None, None, None) for ex in window]
+            keys = [None if decision else
+                    example_key(ex["instruction"], ex["response"],
+                                [MODEL_A, MODEL_B, JUDGE_MODEL], version)
+                    for ex, (decision, _, _) in zip(window, decisions)]
+            todo = ledger.pending(keys)
+            cached += sum(1 for key in keys if key) - len(todo)
+            pairs = [(window[i]["instruction"], window[i]["response"]) for i in todo]
+            if packed:
+                scored = iter_pair_scores_packed(pairs)
+            else:
+                scored = ((j, model_score(MODEL_A, *pair), model_score(MODEL_B, *pair))
+                          for j, pair in enumerate(pairs))
+            for j, score_a, score_b in scored:
+                ledger.record(keys[todo[j]], {"score_a": score_a, "score_b": score_b})
+
+            for example, key, (decision, stage, why) in zip(window, keys, decisions):
+                instr, resp = example["instruction"], example["response"]
+                if decision == "reject":
+                    skipped += 1
+                    continue
+                verdict = ledger.get(key) if key else {}
+                score_a, score_b = verdict.get("score_a"), verdict.get("score_b")
 
-            elif score_a < agree_threshold and score_b < agree_threshold:
-                reason = "Both models agree it's garbage."
-                result = "rejected"
-                skipped += 1
-                continue
+                if decision == "accept":
+                    reason = f"Prefilter {stage}: {why}"
+                    final_score = ACCEPT_SCORE
+                    result = "accepted"
 
-            else:
-                debated += 1
-                verdict = judge_disagreement(instr, resp, score_a, score_b).lower()
-                if "yes" in verdict:
-                    reason = "Disagreement resolved by judge: keep."
-                    final_score = max(score_a, score_b)
+                elif score_a >= agree_threshold and score_b >= agree_threshold:
+                    reason = "Both models agree it's good."
+                    final_score = (score_a + score_b) // 2
                     result = "accepted"
-                else:
-                    reason = "Disagreement resolved by judge: discard."
+
+                elif score_a < agree_threshold and score_b < agree_threshold:
+                    reason = "Both models agree it's garbage."
                     result = "rejected"
                     skipped += 1
                     continue
 
-            example["score"] = final_score
-            example["metadata"].update({
-                "scored_at": datetime.now().isoformat(),
-                "score_a": score_a,
-                "score_b": score_b,
-                "result": result,
-                "reasoning": reason
-            })
-            outfile.write(json.dumps(example) + "\n")
-            kept += 1
-
-    print(f"[DebateFilter] Accepted: {kept}, Rejected: {skipped}, Debated: {debated}")
+                else:
+                    debated += 1
+                    if "judge" not in verdict:
+                        verdict = dict(verdict, judge=judge_disagreement(instr, resp, score_a, score_b))
+                        ledger.record(key, verdict)
+                    if "yes" in verdict["judge"].lower():
+                        reason = "Disagreement resolved by judge: keep."
+                        final_score = max(score_a, score_b)
+                        result = "accepted"
+                    else:
+                        reason = "Disagreement resolved by judge: discard."
+                        result = "rejected"
+                        skipped += 1
+                        continue
+
+                example["score"] = final_score
+                example["metadata"].update({
+                    "scored_at": datetime.now().isoformat(),
+                    "score_a": score_a,
+                    "score_b": score_b,
+                    "result": result,
+                    "reasoning": reason
+                })
+                outfile.write(json.dumps(example) + "\n")
+                kept += 1
+
+    print(f"[DebateFilter] Accepted: {kept}, Rejected: {skipped}, Debated: {debated}, "
+          f"Reused from ledger: {cached}")
+    if cascade:
+        cascade.report("DebateFilter")
 
 if __name__ == "__main__":
     if not os.path.exists(INPUT_FILE):
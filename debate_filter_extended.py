@@ -1,19 +1,30 @@
 # debate_filter_extended.py
 
+import asyncio
 import json
+import math
 import os
 from datetime import datetime
 from llm_client import call_local_model
-
+from verdict_ledger import VerdictLedger, example_key
+from prefilter import ACCEPT_SCORE, resolve as resolve_prefilter
+from packed_scoring import (PACK_WINDOW, estimate_tokens, format_examples, iter_windows,
+                            ledger_version, plan_packs, plan_shared_packs, unpack_slots)
 
 INPUT_FILE = "test_training_data.jsonl"
 OUTPUT_VERIFIED = "debate_output_verified.jsonl"
 OUTPUT_UNVERIFIED = "debate_output_unverified.jsonl"
+LEDGER_FILE = "debate_extended_ledger.jsonl"
 
 MODEL_A = "Mistral Instruct"
 MODEL_B = "Reasoner v1"
 JUDGE_MODEL = "Llama 3.1 8B Instruct 128k"
 MAX_ROUNDS = 3
+# Round-one agreement ends the debate only if both models are at least this sure.
+CONSENSUS_CONFIDENCE = 0.8
+
+# Bump when SYSTEM_PROMPT or the judge prompt changes so old verdicts are not reused.
+PROMPT_VERSION = "debate-extended-v2"
 
 SYSTEM_PROMPT = """
 You are an advanced self-improving AI. Your goal is to select only the best data to fine-tune future versions of yourself. 
@@ -21,10 +32,23 @@ Evaluate the following instruction-response pair for accuracy, usefulness, and c
 
 Respond with this format:
 DECISION: [ACCEPT|REJECT]
+CONFIDENCE: <number between 0 and 1>
 JUSTIFICATION: <clear, technical reasoning>
 """
 
-def score_and_justify(model_name, instruction, response, prior_opinion=None):
+def parse_confidence(text):
+    """0..1 confidence from a CONFIDENCE value; unparseable text counts as not confident."""
+    try:
+        value = float(text.strip().rstrip("%"))
+    except ValueError:
+        return 0.0
+    if not math.isfinite(value):
+        return 0.0
+    if value > 1:
+        value /= 100
+    return min(max(value, 0.0), 1.0)
+
+async def score_and_justify(model_name, instruction, response, prior_opinion=None):
     prompt = SYSTEM_PROMPT + f"""
 Instruction:
 {instruction}
@@ -35,21 +59,63 @@ Response:
     if prior_opinion:
         prompt += f"\nOther model's opinion: {prior_opinion}\n"
 
-    reply = call_local_model(prompt.strip(), model_name)
+    reply = await call_local_model(prompt.strip(), model_name)
     lines = reply.strip().split("\n")
     decision = "REJECT"
+    confidence = 0.0  # a missing CONFIDENCE line never triggers the early exit
     justification = reply.strip()
 
     for line in lines:
         if "DECISION:" in line:
             decision = line.split("DECISION:")[-1].strip().upper()
+        if "CONFIDENCE:" in line:
+            confidence = parse_confidence(line.split("CONFIDENCE:")[-1])
         if "JUSTIFICATION:" in line:
             justification = line.split("JUSTIFICATION:")[-1].strip()
             break
 
-    return decision, justification
+    return decision, justification, confidence
+
+PACKED_PROMPT = """
+You are an advanced self-improving AI. Your goal is to select only the best data to fine-tune future versions of yourself.
+Evaluate each of the following {count} instruction-response pairs for accuracy, usefulness, and clarity.
+
+{examples}
+Respond with only a JSON array of {count} objects, one per example, in order:
+[{{"decision": "ACCEPT" or "REJECT", "confidence": <number between 0 and 1>, "justification": "<clear, technical reasoning>"}}, ...]
+"""
+
+def _valid_opinion(value):
+    if not isinstance(value, dict):
+        return None
+    decision = str(value.get("decision", "")).strip().upper()
+    justification = value.get("justification")
+    if decision not in {"ACCEPT", "REJECT"} or not isinstance(justification, str):
+        return None
+    return decision, justification.strip(), parse_confidence(str(value.get("confidence", "")))
+
+async def score_and_justify_packed(model_name, pairs):
+    """
+    Independent (no prior opinion) opinions for many pairs via packed prompts.
+    Malformed slots are re-asked one by one with score_and_justify().
+    """
+    opinions = [None] * len(pairs)
+    overhead = estimate_tokens(PACKED_PROMPT)
+    for pack in plan_packs(pairs, model_name, overhead, reply_tokens_per_item=120):
+        if len(pack) < 2:
+            continue
+        prompt = PACKED_PROMPT.format(count=len(pack),
+                                      examples=format_examples([pairs[i] for i in pack]))
+        reply = await call_local_model(prompt.strip(), model_name)
+        for i, opinion in zip(pack, unpack_slots(reply, len(pack), _valid_opinion)):
+            opinions[i] = opinion
+    missing = [i for i, opinion in enumerate(opinions) if opinion is None]
+    retried = await asyncio.gather(*(score_and_justify(model_name, *pairs[i]) for i in missing))
+    for i, opinion in zip(missing, retried):
+        opinions[i] = opinion
+    return opinions
 
-def judge_disagreement(instruction, response, a_reason, b_reason):
+async def judge_disagreement(instruction, response, a_reason, b_reason):
     prompt = f"""
 Instruction:
 {instruction}
@@ -65,76 +131,170 @@ Model B justification:
 
 Should this example be included in a fine-tuning dataset? Justify your answer and conclude with YES or NO.
 """
-    reply = call_local_model(prompt.strip(), JUDGE_MODEL)
+    reply = await call_local_model(prompt.strip(), JUDGE_MODEL)
     return reply.strip()
 
-def debate_filter(input_path, verified_out, unverified_out):
+async def debate_example(instr, resp, first_round=None):
+    """
+    Run the full A/B debate (plus judge if needed) for one example.
+    Round one asks A and B independently and concurrently; from round two on
+    each model sees the other's previous justification.  A confident round-one
+    consensus ends the debate after a single pair of parallel calls.
+    *first_round*, if given, is a precomputed (opinion_a, opinion_b) pair,
+    e.g. from score_and_justify_packed().
+    """
+    debate_log = []
+    reason = None
+    reason_a = reason_b = None
+
+    for round_num in range(1, MAX_ROUNDS + 1):
+        if round_num == 1 and first_round is not None:
+            (decision_a, reason_a, conf_a), (decision_b, reason_b, conf_b) = first_round
+        else:
+            (decision_a, reason_a, conf_a), (decision_b, reason_b, conf_b) = await asyncio.gather(
+                score_and_justify(MODEL_A, instr, resp, reason_b),
+                score_and_justify(MODEL_B, instr, resp, reason_a),
+            )
+
+        debate_log.append({
+            "round": round_num,
+            "a": decision_a + ": " + reason_a,
+            "b": decision_b + ": " + reason_b
+        })
+
+        # A hesitant round-one agreement gets one exchange round to confirm it.
+        confident = min(conf_a, conf_b) >= CONSENSUS_CONFIDENCE
+        if decision_a == decision_b and (confident or round_num > 1):
+            final = decision_a
+            break
+    else:
+        verdict = await judge_disagreement(instr, resp, reason_a, reason_b)
+        if "yes" in verdict.lower():
+            final = "ACCEPT"
+            reason = verdict
+        elif "no" in verdict.lower():
+            final = "REJECT"
+            reason = verdict
+        else:
+            final = "UNVERIFIED"
+            reason = verdict
+
+    output = {
+        "instruction": instr,
+        "response": resp,
+        "result": final.lower(),
+        "score_a": decision_a,
+        "score_b": decision_b,
+        "final_score": 10 if final == "ACCEPT" else 1,
+        "justification_a": reason_a,
+        "justification_b": reason_b,
+        "judge_reasoning": reason,
+        "debate_log": debate_log,
+        "metadata": {
+            "model_a": MODEL_A,
+            "model_b": MODEL_B,
+            "judge_model": JUDGE_MODEL,
+            "scored_at": datetime.now().isoformat()
+        }
+    }
+    return final, output
+
+def prefilter_output(instr, resp, stage, reason):
+    """Output record for an example the prefilter accepted without a debate."""
+    return {
+        "instruction": instr,
+        "response": resp,
+        "result": "accept",
+        "score_a": None,
+        "score_b": None,
+        "final_score": ACCEPT_SCORE,
+        "justification_a": None,
+        "justification_b": None,
+        "judge_reasoning": f"Prefilter {stage}: {reason}",
+        "debate_log": [],
+        "metadata": {
+            "model_a": MODEL_A,
+            "model_b": MODEL_B,
+            "judge_model": JUDGE_MODEL,
+            "prefilter": stage,
+            "scored_at": datetime.now().isoformat()
+        }
+    }
+
+async def debate_window(pairs, packed=False):
+    """
+    Debate a list of (instruction, response) pairs, yielding (index, final, output)
+    as each example is settled.  In packed mode the first-round opinions are
+    fetched one pack at a time, so results stream out pack by pack.
+    """
+    if not packed:
+        for j, (instr, resp) in enumerate(pairs):
+            yield (j,) + await debate_example(instr, resp)
+        return
+    overhead = estimate_tokens(PACKED_PROMPT)
+    for pack in plan_shared_packs(pairs, [MODEL_A, MODEL_B], overhead, reply_tokens_per_item=120):
+        subset = [pairs[i] for i in pack]
+        opinions_a, opinions_b = await asyncio.gather(
+            score_and_justify_packed(MODEL_A, subset),
+            score_and_justify_packed(MODEL_B, subset),
+        )
+        for j, (instr, resp), first_round in zip(pack, subset, zip(opinions_a, opinions_b)):
+            yield (j,) + await debate_example(instr, resp, first_round)
+
+async def _debate_and_record(pairs, keys, ledger, packed):
+    async for j, final, output in debate_window(pairs, packed):
+        ledger.record(keys[j], {"final": final, "output": output})
+
+def debate_filter(input_path, verified_out, unverified_out, ledger_path=LEDGER_FILE,
+                  packed=False, prefilter=False):
     print("[DebateFilter] Starting extended debate filter...")
-    kept, skipped, unresolved = 0, 0, 0
+    cascade = resolve_prefilter(prefilter)
+    kept, skipped, unresolved, cached = 0, 0, 0, 0
 
     with open(input_path, "r") as infile, \
          open(verified_out, "w") as goodfile, \
-         open(unverified_out, "w") as badfile:
-
-        for line in infile:
-            example = json.loads(line)
-            instr, resp = example["instruction"], example["response"]
-            debate_log = []
-
-            for round_num in range(1, MAX_ROUNDS + 1):
-                decision_a, reason_a = score_and_justify(MODEL_A, instr, resp)
-                decision_b, reason_b = score_and_justify(MODEL_B, instr, resp, reason_a)
-
-                debate_log.append({
-                    "round": round_num,
-                    "a": decision_a + ": " + reason_a,
-                    "b": decision_b + ": " + reason_b
-                })
-
-                if decision_a == decision_b:
-                    final = decision_a
-                    break
-            else:
-                verdict = judge_disagreement(instr, resp, reason_a, reason_b)
-                if "yes" in verdict.lower():
+         open(unverified_out, "w") as badfile, \
+         VerdictLedger(ledger_path) as ledger:
+
+        version = ledger_version(PROMPT_VERSION, packed)
+        for window in iter_windows(infile, PACK_WINDOW if packed else 1):
+            # Clear cases are settled by the prefilter and never reach the models
+            decisions = [cascade.classify(ex) if cascade else (None, None, None) for ex in window]
+            keys = [None if decision else
+                    example_key(ex["instruction"], ex["response"],
+                                [MODEL_A, MODEL_B, JUDGE_MODEL], version)
+                    for ex, (decision, _, _) in zip(window, decisions)]
+            todo = ledger.pending(keys)
+            cached += sum(1 for key in keys if key) - len(todo)
+            if todo:
+                pairs = [(window[i]["instruction"], window[i]["response"]) for i in todo]
+                # Verdicts are recorded as each example is settled, not per window
+                asyncio.run(_debate_and_record(pairs, [keys[i] for i in todo], ledger, packed))
+
+            for example, key, (decision, stage, reason) in zip(window, keys, decisions):
+                if decision == "reject":
+                    final, output = "REJECT", None
+                elif decision == "accept":
                     final = "ACCEPT"
-                    reason = verdict
-                elif "no" in verdict.lower():
-                    final = "REJECT"
-                    reason = verdict
+                    output = prefilter_output(example["instruction"], example["response"],
+                                              stage, reason)
                 else:
-                    final = "UNVERIFIED"
-                    reason = verdict
-
-            output = {
-                "instruction": instr,
-                "response": resp,
-                "result": final.lower(),
-                "score_a": decision_a,
-                "score_b": decision_b,
-                "final_score": 10 if final == "ACCEPT" else 1,
-                "justification_a": reason_a,
-                "justification_b": reason_b,
-                "judge_reasoning": reason if 'reason' in locals() else None,
-                "debate_log": debate_log,
-                "metadata": {
-                    "model_a": MODEL_A,
-                    "model_b": MODEL_B,
-                    "judge_model": JUDGE_MODEL,
-                    "scored_at": datetime.now().isoformat()
-                }
-            }
-
-            if final == "ACCEPT":
-                goodfile.write(json.dumps(output) + "\n")
-                kept += 1
-            elif final == "REJECT":
-                skipped += 1
-            else:
-                badfile.write(json.dumps(output) + "\n")
-                unresolved += 1
-
-    print(f"[DebateFilter] Accepted: {kept}, Rejected: {skipped}, Unverified: {unresolved}")
+                    verdict = ledger.get(key)
+                    final, output = verdict["final"], verdict["output"]
+
+                if final == "ACCEPT":
+                    goodfile.write(json.dumps(output) + "\n")
+                    kept += 1
+                elif final == "REJECT":
+                    skipped += 1
+                else:
+                    badfile.write(json.dumps(output) + "\n")
+                    unresolved += 1
+
+    print(f"[DebateFilter] Accepted: {kept}, Rejected: {skipped}, Unverified: {unresolved}, "
+          f"Reused from ledger: {cached}")
+    if cascade:
+        cascade.report("DebateFilter")
 
 if __name__ == "__main__":
     if not os.path.exists(INPUT_FILE):
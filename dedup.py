@@ -0,0 +1,161 @@
+# dedup.py
+"""
+Exact + near-duplicate elimination for training examples.
+
+Runs before any LLM scoring so repeated prompts and repeated shell commands
+are only scored once downstream.  Two stages:
+
+1. Exact: hash of the normalized instruction + response.
+2. Near: MinHash signatures over word shingles, bucketed with LSH banding;
+   a candidate counts as a duplicate only if the estimated Jaccard similarity
+   with the bucket's representative is >= NEAR_DUP_THRESHOLD.
+
+All lookup state lives in a SQLite file rather than Python dicts, so memory
+stays bounded over millions of lines.  The first example of each cluster is
+kept as its representative and tagged with the final cluster size.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import struct
+import tempfile
+
+# === CONFIG ===
+NUM_PERM = 64             # MinHash permutations
+BANDS = 8                 # LSH bands (BANDS * ROWS must equal NUM_PERM)
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3          # words per shingle
+NEAR_DUP_THRESHOLD = 0.8  # estimated Jaccard needed to call two examples duplicates
+SEED = 1337
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(SEED)
+_PERMS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+          for _ in range(NUM_PERM)]
+_WS = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    return _WS.sub(" ", text.strip().lower())
+
+
+def shingles(text: str):
+    words = text.split(" ")
+    if len(words) <= SHINGLE_SIZE:
+        return {text}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text: str):
+    """MinHash signature (list of NUM_PERM ints) of a normalized string."""
+    base = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+            for s in shingles(text)]
+    return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in base) for a, b in _PERMS]
+
+
+def estimate_jaccard(sig_a, sig_b) -> float:
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+
+def _band_keys(sig):
+    for band in range(BANDS):
+        chunk = struct.pack(f"<{ROWS}I", *sig[band * ROWS:(band + 1) * ROWS])
+        yield band, hashlib.blake2b(chunk, digest_size=8).digest()
+
+
+class NearDuplicateIndex:
+    """SQLite-backed exact/LSH index mapping examples to cluster representatives."""
+    def __init__(self, db_path: str):
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE IF NOT EXISTS exact (digest BLOB PRIMARY KEY, rep INTEGER);
+            CREATE TABLE IF NOT EXISTS bands (band INTEGER, bucket BLOB, rep INTEGER,
+                                              PRIMARY KEY (band, bucket));
+            CREATE TABLE IF NOT EXISTS reps (rep INTEGER PRIMARY KEY, sig BLOB, size INTEGER);
+        """)
+        self.next_rep = self.db.execute("SELECT COALESCE(MAX(rep), -1) + 1 FROM reps").fetchone()[0]
+
+    def add(self, text: str):
+        """
+        Register *text*.  Returns (rep_id, is_new): is_new is True when this
+        text starts a new cluster (and should be kept).
+        """
+        norm = normalize(text)
+        digest = hashlib.blake2b(norm.encode("utf-8"), digest_size=16).digest()
+        row = self.db.execute("SELECT rep FROM exact WHERE digest = ?", (digest,)).fetchone()
+        if row:
+            return self._join(row[0]), False
+
+        sig = minhash(norm)
+        bands = list(_band_keys(sig))
+        checked = set()
+        for band, bucket in bands:
+            row = self.db.execute("SELECT rep FROM bands WHERE band = ? AND bucket = ?",
+                                  (band, bucket)).fetchone()
+            if not row or row[0] in checked:
+                continue
+            checked.add(row[0])
+            rep_sig = self.db.execute("SELECT sig FROM reps WHERE rep = ?", (row[0],)).fetchone()[0]
+            if estimate_jaccard(sig, struct.unpack(f"<{NUM_PERM}I", rep_sig)) >= NEAR_DUP_THRESHOLD:
+                self.db.execute("INSERT OR IGNORE INTO exact VALUES (?, ?)", (digest, row[0]))
+                return self._join(row[0]), False
+
+        rep = self.next_rep
+        self.next_rep += 1
+        self.db.execute("INSERT INTO reps VALUES (?, ?, 1)", (rep, struct.pack(f"<{NUM_PERM}I", *sig)))
+        self.db.execute("INSERT INTO exact VALUES (?, ?)", (digest, rep))
+        self.db.executemany("INSERT OR IGNORE INTO bands VALUES (?, ?, ?)",
+                            [(band, bucket, rep) for band, bucket in bands])
+        return rep, True
+
+    def _join(self, rep: int) -> int:
+        self.db.execute("UPDATE reps SET size = size + 1 WHERE rep = ?", (rep,))
+        return rep
+
+    def cluster_size(self, rep: int) -> int:
+        row = self.db.execute("SELECT size FROM reps WHERE rep = ?", (rep,)).fetchone()
+        return row[0] if row else 0
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+def dedupe_stream(examples, work_dir=None, stats=None):
+    """
+    Stream *examples* (dicts with instruction/response) and yield one
+    representative per duplicate cluster, with ``cluster_size`` set.
+
+    Representatives are spilled to a temp JSONL file during the first pass,
+    because a cluster's final size is only known once the input is exhausted.
+    """
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        index = NearDuplicateIndex(os.path.join(tmp, "dedup.sqlite"))
+        spill_path = os.path.join(tmp, "representatives.jsonl")
+        seen = kept = 0
+        try:
+            with open(spill_path, "w") as spill:
+                for example in examples:
+                    seen += 1
+                    rep, is_new = index.add(example["instruction"] + "\n" + example["response"])
+                    if is_new:
+                        kept += 1
+                        spill.write(json.dumps([rep, example]) + "\n")
+            if stats is not None:
+                stats.update({"seen": seen, "kept": kept, "removed": seen - kept})
+            print(f"[Dedup] {seen} examples -> {kept} unique ({seen - kept} duplicates removed)")
+
+            with open(spill_path, "r") as spill:
+                for line in spill:
+                    rep, example = json.loads(line)
+                    example["cluster_size"] = index.cluster_size(rep)
+                    yield example
+        finally:
+            index.close()
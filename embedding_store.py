@@ -0,0 +1,263 @@
+# embedding_store.py
+"""
+Local, offline vector store for the semantic memory features
+(plan recall, memory search, file retrieval).
+
+A store at ``<path>`` consists of:
+
+    <path>.f32         float32 matrix, one row per vector, appended in place
+    <path>.ids.jsonl   one {"id": ..., "meta": {...}} line per row
+    <path>.meta.json   dimension, row count and embedding backend
+    <path>.ivf.npz     optional IVF coarse index (centroids + row lists)
+    <path>.hnsw        optional hnswlib graph, if hnswlib is installed
+
+Opening a store memory-maps the matrix (no parsing), and search is a single
+vectorized matrix-vector product plus argpartition for the top-k.  For large
+stores, build_ivf() trains a small k-means coarse quantizer so a query only
+scans the nprobe closest lists; rows added after the build are scanned
+exhaustively until the next build.  build_hnsw() uses hnswlib instead when
+it is available.
+
+embed_and_cache() is the batched pipeline: texts are keyed by content hash,
+and only texts not already in the store are sent to the embedding backend.
+
+Requires numpy (hnswlib is optional).  MemoryRecaller uses a store as its
+plan-vector index when numpy is importable and falls back to a pure-Python
+scan otherwise.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import embeddings
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+# === CONFIG ===
+IVF_MIN_SIZE = 50_000    # below this, exhaustive search is fast enough
+IVF_NPROBE = 8
+IVF_KMEANS_ITERS = 10
+EMBED_BATCH_SIZE = 64
+
+
+def text_id(text: str, backend: str) -> str:
+    return hashlib.sha256(f"{backend}\x1f{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(self, path, dim=None, backend=None):
+        self.path = path
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.meta = {"dim": dim, "count": 0, "backend": backend}
+        if os.path.exists(path + ".meta.json"):
+            with open(path + ".meta.json", "r") as f:
+                self.meta = json.load(f)
+        self.ids, self.metadata = [], []
+        self.row_of = {}
+        self._load_ids()
+        self._matrix = None
+        self._ivf = None
+        self._hnsw = None
+
+    # ---- persistence ------------------------------------------------------ #
+    def _load_ids(self):
+        self._ids_bytes = 0   # byte length of the committed lines of ids.jsonl
+        if not os.path.exists(self.path + ".ids.jsonl"):
+            return
+        with open(self.path + ".ids.jsonl", "rb") as f:
+            for line in f:
+                if len(self.ids) >= self.meta["count"]:
+                    break  # rows past the committed count belong to an interrupted add
+                entry = json.loads(line)
+                self.row_of[entry["id"]] = len(self.ids)
+                self.ids.append(entry["id"])
+                self.metadata.append(entry.get("meta") or {})
+                self._ids_bytes += len(line)
+
+    def _save_meta(self):
+        tmp = self.path + ".meta.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.path + ".meta.json")
+
+    @property
+    def dim(self):
+        return self.meta["dim"]
+
+    @property
+    def matrix(self):
+        """Memory-mapped (count, dim) float32 matrix."""
+        if self._matrix is None:
+            if not self.meta["count"]:
+                return np.zeros((0, self.dim or 0), dtype=np.float32)
+            self._matrix = np.memmap(self.path + ".f32", dtype=np.float32, mode="r",
+                                     shape=(self.meta["count"], self.dim))
+        return self._matrix
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def __contains__(self, item_id):
+        return item_id in self.row_of
+
+    # ---- writing ---------------------------------------------------------- #
+    def add(self, ids, vectors, metadata=None):
+        """Append vectors (L2-normalized on the way in); ids already present are skipped."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if self.dim is None:
+            self.meta["dim"] = int(vectors.shape[1])
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d vectors, got {vectors.shape[1]}-d")
+        metadata = metadata or [{}] * len(ids)
+
+        keep = [i for i, item_id in enumerate(ids) if item_id not in self.row_of]
+        if not keep:
+            return 0
+        block = vectors[keep]
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        block = block / np.where(norms == 0, 1, norms)
+
+        # Truncate anything an interrupted add left past the committed rows,
+        # in both files, so row i and id line i stay aligned
+        count = self.meta["count"]
+        with open(self.path + ".f32", "ab") as f:
+            f.truncate(count * self.dim * 4)
+            f.write(np.ascontiguousarray(block).tobytes())
+        lines = b"".join(json.dumps({"id": ids[i], "meta": metadata[i]}).encode("utf-8") + b"\n"
+                         for i in keep)
+        with open(self.path + ".ids.jsonl", "ab") as f:
+            f.truncate(self._ids_bytes)
+            f.write(lines)
+        self._ids_bytes += len(lines)
+        for i in keep:
+            self.row_of[ids[i]] = len(self.ids)
+            self.ids.append(ids[i])
+            self.metadata.append(metadata[i])
+        self.meta["count"] = count + len(keep)
+        self._save_meta()
+        self._matrix = None
+        return len(keep)
+
+    # ---- approximate indexes ---------------------------------------------- #
+    def build_ivf(self, nlist=None, seed=0):
+        """Train a k-means coarse quantizer over the current rows and persist it."""
+        matrix = np.asarray(self.matrix)
+        n = len(matrix)
+        if n == 0:
+            return
+        nlist = nlist or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(n, size=min(nlist, n), replace=False)].copy()
+        for _ in range(IVF_KMEANS_ITERS):
+            assign = np.argmax(matrix @ centroids.T, axis=1)
+            for c in range(len(centroids)):
+                members = matrix[assign == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1)
+        assign = np.argmax(matrix @ centroids.T, axis=1)
+        np.savez(self.path + ".ivf.npz", centroids=centroids, assign=assign.astype(np.int32),
+                 built_rows=np.int64(n))
+        self._ivf = None
+        print(f"[EmbeddingStore] Built IVF index: {len(centroids)} lists over {n} rows.")
+
+    def build_hnsw(self, m=16, ef_construction=200):
+        if hnswlib is None:
+            raise RuntimeError("hnswlib is not installed; use build_ivf() instead")
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        index.init_index(max_elements=len(self), ef_construction=ef_construction, M=m)
+        index.add_items(np.asarray(self.matrix), np.arange(len(self)))
+        index.save_index(self.path + ".hnsw")
+        self._hnsw = None
+
+    def _load_ivf(self):
+        if self._ivf is None and os.path.exists(self.path + ".ivf.npz"):
+            data = np.load(self.path + ".ivf.npz")
+            self._ivf = (data["centroids"], data["assign"], int(data["built_rows"]))
+        return self._ivf
+
+    def _load_hnsw(self):
+        if self._hnsw is None and hnswlib is not None and os.path.exists(self.path + ".hnsw"):
+            index = hnswlib.Index(space="ip", dim=self.dim)
+            index.load_index(self.path + ".hnsw")
+            self._hnsw = index
+        return self._hnsw
+
+    # ---- querying --------------------------------------------------------- #
+    def _candidates(self, query, nprobe):
+        ivf = self._load_ivf() if len(self) >= IVF_MIN_SIZE else None
+        if ivf is None:
+            return None
+        centroids, assign, built_rows = ivf
+        probe = np.argsort(-(centroids @ query))[:nprobe]
+        rows = np.nonzero(np.isin(assign, probe))[0]
+        tail = np.arange(built_rows, len(self))
+        return np.concatenate([rows, tail])
+
+    def search(self, query, top_k=10, nprobe=IVF_NPROBE):
+        """Return [(id, cosine, metadata)] for the top_k nearest rows."""
+        if not len(self):
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+
+        hnsw = self._load_hnsw() if len(self) >= IVF_MIN_SIZE else None
+        if hnsw is not None and hnsw.get_current_count() == len(self):
+            hnsw.set_ef(max(top_k * 4, 50))
+            labels, distances = hnsw.knn_query(query, k=min(top_k, len(self)))
+            return [(self.ids[r], float(1 - d), self.metadata[r])
+                    for r, d in zip(labels[0], distances[0])]
+
+        rows = self._candidates(query, nprobe)
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        scores = matrix @ query
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        if rows is not None:
+            return [(self.ids[rows[i]], float(scores[i]), self.metadata[rows[i]]) for i in best]
+        return [(self.ids[i], float(scores[i]), self.metadata[i]) for i in best]
+
+    def get(self, item_id):
+        row = self.row_of.get(item_id)
+        return None if row is None else np.asarray(self.matrix[row])
+
+
+def embed_and_cache(store, texts, metadata=None, batch_size=EMBED_BATCH_SIZE):
+    """
+    Make sure every text has a vector in *store*, embedding only the ones not
+    seen before (in batches).  Returns the ids (content hashes) in input order.
+    """
+    backend = store.meta.get("backend") or embeddings.backend_name()
+    if store.meta.get("backend") is None:
+        store.meta["backend"] = backend
+    elif store.meta["backend"] != embeddings.backend_name():
+        raise ValueError(f"Store was built with {store.meta['backend']!r}, "
+                         f"current backend is {embeddings.backend_name()!r}")
+
+    ids = [text_id(t, backend) for t in texts]
+    metadata = metadata or [{} for _ in texts]
+    pending, seen = [], set()
+    for i, item_id in enumerate(ids):
+        if item_id not in store and item_id not in seen:
+            pending.append(i)
+            seen.add(item_id)
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        vectors = embeddings.embed_texts([texts[i] for i in batch])
+        store.add([ids[i] for i in batch], vectors, [metadata[i] for i in batch])
+    if pending:
+        print(f"[EmbeddingStore] Embedded {len(pending)} new texts "
+              f"({len(texts) - len(pending)} served from cache).")
+    return ids
@@ -0,0 +1,80 @@
+# embeddings.py
+"""
+Local text embeddings for semantic memory features.
+
+Uses a sentence-transformers model when the package and model are available
+locally; otherwise falls back to hashed character/word n-gram vectors, which
+need no model at all and still give high similarity for near-identical text.
+All vectors are L2-normalized, so cosine similarity is a plain dot product.
+"""
+
+import hashlib
+import math
+import re
+
+# === CONFIG ===
+EMBED_MODEL = "all-MiniLM-L6-v2"
+HASH_DIM = 512
+CHAR_NGRAM = 3
+
+_WORD = re.compile(r"\w+")
+_model = None
+_model_failed = False
+
+
+def _load_model():
+    global _model, _model_failed
+    if _model is None and not _model_failed:
+        try:
+            from sentence_transformers import SentenceTransformer
+            _model = SentenceTransformer(EMBED_MODEL)
+        except Exception as e:  # not installed, or model not downloaded (offline)
+            print(f"[Embeddings] Using hashed n-gram vectors ({e.__class__.__name__}).")
+            _model_failed = True
+    return _model
+
+
+def _bucket(feature: str):
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % HASH_DIM, 1.0 if value >> 63 else -1.0
+
+
+def hashed_ngram_vector(text: str):
+    vec = [0.0] * HASH_DIM
+    text = text.lower()
+    words = _WORD.findall(text)
+    features = list(words)
+    features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {' '.join(words)} "
+    features += [padded[i:i + CHAR_NGRAM] for i in range(len(padded) - CHAR_NGRAM + 1)]
+    for feature in features:
+        index, sign = _bucket(feature)
+        vec[index] += sign
+    return normalize(vec)
+
+
+def normalize(vec):
+    norm = math.sqrt(sum(v * v for v in vec))
+    return [v / norm for v in vec] if norm else list(vec)
+
+
+def backend_name() -> str:
+    return EMBED_MODEL if _load_model() is not None else f"hashed-ngram-{HASH_DIM}"
+
+
+def embed_texts(texts):
+    """Embed a batch of texts; returns a list of normalized float vectors."""
+    model = _load_model()
+    if model is not None:
+        return [normalize([float(v) for v in row])
+                for row in model.encode(list(texts), batch_size=32, show_progress_bar=False)]
+    return [hashed_ngram_vector(t) for t in texts]
+
+
+def embed_text(text: str):
+    return embed_texts([text])[0]
+
+
+def cosine(a, b) -> float:
+    return sum(x * y for x, y in zip(a, b))
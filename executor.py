@@ -1,30 +1,124 @@
-import subprocess
 import os
 import uuid
 import json
+import weakref
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from blob_store import BLOB_DIR, BlobStore, externalize
+from shell_runner import DEFAULT_TIMEOUT, OutputWindow, run_command
+
+LOG_FLUSH_EVERY = 1   # entries buffered before they are written to the session log
+MAX_PARALLEL_STEPS = 4  # pool size for plans with id/depends_on hints
+STREAM_LOG_HEAD = 16 * 1024  # bytes of each command's output written to the .out log live
+STREAM_LOG_TAIL = 16 * 1024  # bytes from the end of the output, written once it finishes
+
+def _write_log_lines(path, pending, fsync):
+    """Append buffered JSONL lines to *path* (also run at GC/exit for leftovers)."""
+    if not pending:
+        return
+    with open(path, "a") as f:
+        f.write("".join(pending))
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    pending.clear()
+
+def load_session_log(path):
+    """
+    Load a session log as a list of entries.  Reads the append-only JSONL
+    format (skipping a torn last line) and legacy pretty-printed .json logs.
+    """
+    with open(path, "r") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        entries = []
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return entries
+
+def latest_session_log(log_dir):
+    """Path of the most recently written session log in *log_dir*, or None."""
+    if not os.path.isdir(log_dir):
+        return None
+    logs = [os.path.join(log_dir, f) for f in os.listdir(log_dir)
+            if f.startswith("session_") and f.endswith((".jsonl", ".json"))]
+    return max(logs, key=os.path.getmtime) if logs else None
 
 class Executor:
     """
     Executes shell commands, applies file patches, and logs every action.
     Now with persistent working-directory support.
     """
-    def __init__(self, log_dir="execution_logs", dry_run=False):
+    def __init__(self, log_dir="execution_logs", dry_run=False, fsync=False,
+                 flush_every=LOG_FLUSH_EVERY, blob_dir=BLOB_DIR, timeout=DEFAULT_TIMEOUT,
+                 on_output=None):
         self.log_dir = log_dir
         self.dry_run = dry_run
+        self.timeout = timeout
+        # on_output(stream, line) sees command output live, as it is produced
+        self.on_output = on_output
+        # Large outputs and patch backups go to a shared content-addressed store
+        self.blobs = BlobStore(blob_dir)
         os.makedirs(log_dir, exist_ok=True)
         self.session_id = str(uuid.uuid4())
-        self.log_path = os.path.join(log_dir, f"session_{self.session_id}.json")
+        # Append-only JSONL: each action costs one line, not a rewrite of the session
+        self.log_path = os.path.join(log_dir, f"session_{self.session_id}.jsonl")
+        # Live output of every command, streamed line by line (tail -f friendly)
+        self.stream_path = os.path.join(log_dir, f"session_{self.session_id}.out")
         self.log = []
+        self.fsync = fsync
+        self.flush_every = max(1, flush_every)
+        self._pending = []
+        self._log_lock = threading.Lock()   # steps may run concurrently (execute_plan)
+        self._command_seq = 0               # tags each command's lines in the .out log
+        # Anything still buffered is written when the executor goes away
+        self._finalizer = weakref.finalize(self, _write_log_lines, self.log_path, self._pending, fsync)
         # start in whatever directory launched this script
         self.cwd = os.getcwd()
 
-    def run_shell(self, command, require_confirm=False):
+    def _stream_log(self, stream_file, command):
+        """
+        Return (tag, on_output, finish) for one command.  Lines go to the .out
+        log prefixed with the command's tag, so concurrent steps can be told
+        apart.  Only the first STREAM_LOG_HEAD bytes are written as they
+        arrive; finish() writes the last STREAM_LOG_TAIL bytes and how much
+        was left out, so a chatty command cannot bloat the log.
+        """
+        with self._log_lock:
+            self._command_seq += 1
+            tag = f"#{self._command_seq}"
+        tail = OutputWindow(0, STREAM_LOG_TAIL)
+        written = [0]
+
+        def callback(stream, line):
+            data = f"[{tag} {stream}] {line}" if line.endswith("\n") else f"[{tag} {stream}] {line}\n"
+            if written[0] < STREAM_LOG_HEAD:
+                stream_file.write(data)
+                written[0] += len(data.encode("utf-8"))
+            else:
+                tail.add(data.encode("utf-8"))
+            if self.on_output is not None:
+                self.on_output(stream, line)
+
+        def finish():
+            if tail.omitted:
+                stream_file.write(f"[{tag}] ... {tail.omitted} bytes not logged ...\n")
+            stream_file.write(b"".join(tail.tail).decode("utf-8", errors="replace"))
+
+        stream_file.write(f"[{tag}] $ {command}\n")
+        return tag, callback, finish
+
+    def run_shell(self, command, require_confirm=False, timeout=None):
         if require_confirm:
             print(f"[Executor] Confirm before executing: {command}")
             return {"status": "waiting", "command": command}
 
         print(f"[Executor] Running in {self.cwd}: {command}")
+        tag = None
         # Dry-run: simulate success without touching anything
         if self.dry_run:
             result = {"stdout": "[dry run]", "stderr": "", "code": 0}
@@ -41,25 +135,39 @@ class Executor:
                     else:
                         result = {"status": "error", "message": f"No such directory: {new_dir}"}
                 else:
-                    # run in the current working directory
-                    completed = subprocess.run(
-                        command,
-                        shell=True,
-                        text=True,
-                        capture_output=True,
-                        cwd=self.cwd
-                    )
-                    result = {
-                        "stdout": completed.stdout,
-                        "stderr": completed.stderr,
-                        "code": completed.returncode,
-                    }
+                    # run in the current working directory, streaming output with
+                    # a wall-clock timeout and head/tail-capped capture
+                    with open(self.stream_path, "a", buffering=1) as stream_file:
+                        tag, on_output, finish = self._stream_log(stream_file, command)
+                        result = run_command(
+                            command,
+                            cwd=self.cwd,
+                            timeout=self.timeout if timeout is None else timeout,
+                            on_output=on_output,
+                        )
+                        finish()
+                    if result["timed_out"]:
+                        print(f"[Executor] Timed out after {result['duration']}s: {command}")
             except Exception as e:
                 result = {"stdout": "", "stderr": str(e), "code": -1}
 
-        self._log_action("shell", command, result)
+        logged = self._compact_output(result)
+        if tag is not None:
+            logged["output_tag"] = tag   # its lines in the .out log
+        self._log_action("shell", command, logged)
         return result
 
+    def _compact_output(self, result):
+        """Copy of *result* for the log, with large stdout/stderr moved to the blob store."""
+        logged = dict(result)
+        for stream in ("stdout", "stderr"):
+            if isinstance(logged.get(stream), str):
+                logged[stream], info = externalize(logged[stream], self.blobs)
+                if info:
+                    logged[f"{stream}_blob"] = info["blob"]
+                    logged[f"{stream}_bytes"] = info["bytes"]
+        return logged
+
     def apply_patch(self, filepath, new_content, require_backup=True):
         # interpret relative paths against the current cwd
         full_path = filepath if os.path.isabs(filepath) else os.path.join(self.cwd, filepath)
@@ -67,10 +175,11 @@ class Executor:
         if not os.path.exists(full_path):
             return {"status": "error", "message": f"File not found: {full_path}"}
 
-        backup_path = None
+        backup = {}
         if require_backup:
-            backup_path = f"{full_path}.bak.{datetime.now():%Y%m%d%H%M%S}"
-            os.rename(full_path, backup_path)
+            # Stored once per distinct content; no .bak files next to the target
+            digest, size = self.blobs.put_file(full_path)
+            backup = {"backup_blob": digest, "backup_bytes": size}
 
         with open(full_path, "w") as f:
             f.write(new_content)
@@ -78,9 +187,28 @@ class Executor:
         self._log_action(
             "file_patch",
             full_path,
-            {"backup": backup_path, "status": "success"},
+            dict(backup, status="success"),
         )
-        return {"status": "success", "filepath": full_path}
+        return dict(backup, status="success", filepath=full_path)
+
+    def restore_backup(self, filepath, digest=None):
+        """
+        Restore *filepath* from the blob store: from *digest* if given, else
+        from the most recent backup of that file in this session's log.
+        """
+        full_path = filepath if os.path.isabs(filepath) else os.path.join(self.cwd, filepath)
+        if digest is None:
+            for entry in reversed(self.load_log()):
+                if entry["action"] == "file_patch" and entry["target"] == full_path \
+                        and entry["result"].get("backup_blob"):
+                    digest = entry["result"]["backup_blob"]
+                    break
+        if digest is None or digest not in self.blobs:
+            return {"status": "error", "message": f"No stored backup for {full_path}"}
+        size = self.blobs.restore_file(digest, full_path)
+        result = {"status": "success", "restored_blob": digest, "bytes": size}
+        self._log_action("file_restore", full_path, result)
+        return dict(result, filepath=full_path)
 
     def _log_action(self, action_type, target, result):
         entry = {
@@ -90,34 +218,125 @@ class Executor:
             "cwd": self.cwd,
             "result": result,
         }
-        self.log.append(entry)
-        with open(self.log_path, "w") as f:
-            json.dump(self.log, f, indent=2)
+        with self._log_lock:
+            self.log.append(entry)
+            self._pending.append(json.dumps(entry) + "\n")
+            if len(self._pending) >= self.flush_every:
+                _write_log_lines(self.log_path, self._pending, self.fsync)
+
+    def flush(self):
+        with self._log_lock:
+            _write_log_lines(self.log_path, self._pending, self.fsync)
 
     def load_log(self):
+        self.flush()
         if os.path.exists(self.log_path):
-            with open(self.log_path, "r") as f:
-                return json.load(f)
+            return load_session_log(self.log_path)
         return []
 
-def execute_plan(plan):
+def _step_path(step):
+    return step.get("path") or step.get("target") or step.get("file")
+
+def _run_step(executor, step):
+    t = step.get("type")
+    if t == "shell":
+        return executor.run_shell(step.get("content", ""), timeout=step.get("timeout"))
+    if t == "file":
+        return executor.apply_patch(_step_path(step), step.get("content", ""))
+    print(f"[execute_plan] Unknown step type: {t!r}, skipping.")
+    return None
+
+def _step_failed(result):
+    return isinstance(result, dict) and (result.get("code", 0) != 0 or result.get("status") == "error")
+
+def plan_dependencies(plan, cwd):
+    """
+    Map each step index to {dependency index: explicit?}.
+    - Steps without 'depends_on' wait for the previous step (serial default).
+    - 'depends_on' lists ids of other steps; [] marks an independent step.
+    - A 'cd' step changes the shared cwd, so it waits for everything before
+      it and everything after it waits for it.
+    - File steps on the same path keep plan order.
+    """
+    ids = {step["id"]: i for i, step in enumerate(plan) if isinstance(step, dict) and "id" in step}
+    deps, last_barrier, last_write = [], None, {}
+    for i, step in enumerate(plan):
+        edges = {}
+        if "depends_on" in step:
+            hinted = step["depends_on"]
+            for dep_id in hinted if isinstance(hinted, list) else [hinted]:
+                if ids.get(dep_id, i) < i:
+                    edges[ids[dep_id]] = True
+                else:
+                    print(f"[execute_plan] Step {i}: ignoring unknown/forward dependency {dep_id!r}")
+        elif i > 0:
+            edges[i - 1] = False
+        if step.get("type") == "shell" and step.get("content", "").strip().startswith("cd "):
+            edges.update({j: edges.get(j, False) for j in range(i)})
+            last_barrier = i
+        elif last_barrier is not None:
+            edges.setdefault(last_barrier, False)
+        if step.get("type") == "file" and _step_path(step):
+            path = os.path.normpath(os.path.join(cwd, _step_path(step)))
+            if path in last_write:
+                edges.setdefault(last_write[path], False)
+            last_write[path] = i
+        deps.append(edges)
+    return deps
+
+def execute_plan(plan, max_workers=MAX_PARALLEL_STEPS):
     """
     Execute a GPT-generated plan: a list of step dicts.
     Each step must have:
       - 'type': either "shell" or "file"
       - if shell: 'content' = the command
       - if file:   'path' or 'target' or 'file' + 'content' = new file contents
+    Optional hints: 'id' and 'depends_on' (list of ids).  Steps whose
+    dependencies are done run concurrently in a pool of max_workers threads;
+    steps without hints run serially, as before.  A step whose explicit
+    dependency failed is not run.
+    Returns the list of per-step results in plan order (None for skipped steps).
     """
     executor = Executor()
-    for step in plan:
-        t = step.get("type")
-        if t == "shell":
-            executor.run_shell(step.get("content", ""))
-        elif t == "file":
-            path = step.get("path") or step.get("target") or step.get("file")
-            executor.apply_patch(path, step.get("content", ""))
-        else:
-            print(f"[execute_plan] Unknown step type: {t!r}, skipping.")
+    hinted = any(isinstance(step, dict) and ("id" in step or "depends_on" in step) for step in plan)
+    if not hinted or max_workers <= 1:
+        return [_run_step(executor, step) for step in plan]
+
+    deps = plan_dependencies(plan, executor.cwd)
+    results = [None] * len(plan)
+    pending, running = set(range(len(plan))), {}
+    done = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for i in sorted(pending):
+                if len(running) >= max_workers:
+                    break
+                if not all(d in done for d in deps[i]):
+                    continue
+                pending.discard(i)
+                failed = [d for d, explicit in deps[i].items() if explicit and _step_failed(results[d])]
+                if failed:
+                    print(f"[execute_plan] Skipping step {i}: dependency {failed} failed.")
+                    results[i] = {"status": "error", "message": f"skipped: dependency {failed} failed"}
+                    done.add(i)
+                    continue
+                running[pool.submit(_run_step, executor, plan[i])] = i
+            if not running:
+                if pending:  # only reachable if dependencies can never be met
+                    print("[execute_plan] Unsatisfiable dependencies; running the rest in order.")
+                    for i in sorted(pending):
+                        results[i] = _run_step(executor, plan[i])
+                    pending.clear()
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = running.pop(future)
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    results[i] = {"status": "error", "message": str(e)}
+                done.add(i)
+    return results
 
 if __name__ == "__main__":
     exe = Executor(dry_run=False)
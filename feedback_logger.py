@@ -1,6 +1,7 @@
 import os
 import json
 from datetime import datetime
+from executor import latest_session_log, load_session_log
 
 class FeedbackLogger:
     """
@@ -11,12 +12,8 @@ class FeedbackLogger:
         self.log_dir = log_dir
 
     def _load_latest_log(self):
-        logs = [f for f in os.listdir(self.log_dir) if f.endswith(".json")]
-        if not logs:
-            return []
-        latest = max(logs, key=lambda x: os.path.getmtime(os.path.join(self.log_dir, x)))
-        with open(os.path.join(self.log_dir, latest), "r") as f:
-            return json.load(f)
+        latest = latest_session_log(self.log_dir)
+        return load_session_log(latest) if latest else []
 
     def summarize(self, last_n=5):
         entries = self._load_latest_log()[-last_n:]
@@ -35,9 +32,14 @@ class FeedbackLogger:
 
             elif action == "file_patch":
                 line = f"Patched file '{target}'"
-                if result.get("backup"):
+                if result.get("backup_blob"):
+                    line += f" (backup stored as blob {result['backup_blob'][:12]})"
+                elif result.get("backup"):
                     line += f" (backup created at {result['backup']})"
 
+            elif action == "file_restore":
+                line = f"Restored file '{target}' from blob {result.get('restored_blob', '')[:12]}"
+
             else:
                 line = f"Unknown action type: {action}"
 
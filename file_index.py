@@ -0,0 +1,141 @@
+# file_index.py
+"""
+Persistent, incrementally refreshed index of the files under a base directory.
+
+Each indexed file has a row (path, size, mtime_ns, sha256) in a SQLite file.
+refresh() walks the tree with os.scandir, pruning excluded directories, and
+only re-hashes files whose (size, mtime) changed; rows for vanished files are
+dropped.  refresh_if_stale() skips the walk entirely when the last refresh is
+recent, so tool calls read the index instead of the filesystem.
+
+Include/exclude rules are fnmatch patterns matched against both the relative
+path and the bare name.  A directory matching an exclude rule is not entered.
+"""
+
+import fnmatch
+import hashlib
+import os
+import re
+import sqlite3
+import time
+
+# === CONFIG ===
+FILE_INDEX_DB = "file_index.sqlite"
+DEFAULT_INCLUDE = ["*"]
+DEFAULT_EXCLUDE = [".git", "__pycache__", "node_modules", ".venv", "venv", ".mypy_cache",
+                   "*.pyc", "*.pyo", "*.so", "*.o", ".DS_Store", "*.sqlite", "*.sqlite-journal"]
+REFRESH_INTERVAL = 30.0     # seconds; refresh_if_stale() won't rescan more often
+HASH_CHUNK = 1 << 20
+
+_PATH_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _matches(rel_path, patterns):
+    name = os.path.basename(rel_path)
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+class FileIndex:
+    def __init__(self, base_dir, db_path=FILE_INDEX_DB, include=None, exclude=None):
+        self.base_dir = os.path.abspath(base_dir)
+        self.include = include or DEFAULT_INCLUDE
+        self.exclude = DEFAULT_EXCLUDE if exclude is None else exclude
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (base TEXT, path TEXT, size INTEGER,
+                                              mtime_ns INTEGER, sha256 TEXT,
+                                              PRIMARY KEY (base, path));
+            CREATE TABLE IF NOT EXISTS meta (base TEXT PRIMARY KEY, refreshed REAL);
+        """)
+
+    # ---- scanning --------------------------------------------------------- #
+    def _scan(self):
+        stack = [self.base_dir]
+        while stack:
+            current = stack.pop()
+            try:
+                entries = list(os.scandir(current))
+            except OSError:
+                continue
+            for entry in entries:
+                rel = os.path.relpath(entry.path, self.base_dir)
+                if _matches(rel, self.exclude):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file() and _matches(rel, self.include):
+                        st = entry.stat()
+                        yield rel, st.st_size, st.st_mtime_ns
+                except OSError:
+                    continue
+
+    def refresh(self):
+        """Rescan the tree; returns {"added": [...], "changed": [...], "removed": [...]}."""
+        known = {path: (size, mtime) for path, size, mtime in self.db.execute(
+            "SELECT path, size, mtime_ns FROM files WHERE base = ?", (self.base_dir,))}
+        added, changed, rows = [], [], []
+        for rel, size, mtime in self._scan():
+            previous = known.pop(rel, None)
+            if previous == (size, mtime):
+                continue
+            try:
+                digest = file_sha256(os.path.join(self.base_dir, rel))
+            except OSError:
+                continue
+            (changed if previous else added).append(rel)
+            rows.append((self.base_dir, rel, size, mtime, digest))
+        removed = list(known)
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", rows)
+            self.db.executemany("DELETE FROM files WHERE base = ? AND path = ?",
+                                [(self.base_dir, p) for p in removed])
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (self.base_dir, time.time()))
+        if rows or removed:
+            print(f"[FileIndex] {len(added)} added, {len(changed)} changed, {len(removed)} removed.")
+        return {"added": added, "changed": changed, "removed": removed}
+
+    def last_refresh(self):
+        row = self.db.execute("SELECT refreshed FROM meta WHERE base = ?", (self.base_dir,)).fetchone()
+        return row[0] if row else None
+
+    def refresh_if_stale(self, max_age=REFRESH_INTERVAL):
+        last = self.last_refresh()
+        if last is None or time.time() - last >= max_age:
+            return self.refresh()
+        return None
+
+    # ---- querying --------------------------------------------------------- #
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM files WHERE base = ?", (self.base_dir,)).fetchone()[0]
+
+    def get(self, path):
+        row = self.db.execute("SELECT path, size, mtime_ns, sha256 FROM files WHERE base = ? AND path = ?",
+                              (self.base_dir, path)).fetchone()
+        return dict(zip(("path", "size", "mtime_ns", "sha256"), row)) if row else None
+
+    def paths(self):
+        return [row[0] for row in self.db.execute(
+            "SELECT path FROM files WHERE base = ? ORDER BY path", (self.base_dir,))]
+
+    def search(self, query: str, limit=50):
+        """
+        Rank indexed paths by how many query terms occur in them (most recently
+        modified first on ties); returns up to *limit* relative paths.
+        """
+        terms = set(_PATH_TOKEN.findall(query.lower()))
+        scored = []
+        for path, mtime in self.db.execute("SELECT path, mtime_ns FROM files WHERE base = ?",
+                                           (self.base_dir,)):
+            lowered = path.lower()
+            scored.append((sum(term in lowered for term in terms), mtime, path))
+        scored.sort(reverse=True)
+        return [path for _, _, path in scored[:limit]]
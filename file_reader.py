@@ -0,0 +1,135 @@
+# file_reader.py
+"""
+Bounded, range-based file reads for agent tools.
+
+read_range() returns at most max_bytes of a file, selected either by byte
+range (offset/length) or by 1-based inclusive line range.  Files at or above
+MMAP_MIN_BYTES are memory-mapped, so finding a line range in a large log
+scans pages in C instead of loading the file.  Binary files (a NUL byte in
+the first block) are reported, never decoded.
+
+When a read stops early, the result carries a continuation cursor: an
+opaque token recording the path, the next offset and line, and the file's
+mtime.  Passing it back resumes exactly where the previous read stopped.
+"""
+
+import base64
+import json
+import mmap
+import os
+
+# === CONFIG ===
+MAX_READ_BYTES = 32 * 1024        # per-file cap for one read
+MAX_TOTAL_BYTES = 64 * 1024       # cap across all files in one tool result
+MMAP_MIN_BYTES = 1024 * 1024
+BINARY_SNIFF_BYTES = 8192
+
+
+def encode_cursor(path, offset, end, line, mtime_ns) -> str:
+    raw = json.dumps({"p": path, "o": offset, "e": end, "l": line, "m": mtime_ns},
+                     separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid continuation cursor")
+
+
+class _View:
+    """bytes for small files, mmap for large ones; both support find/slicing."""
+    def __init__(self, path, size):
+        self._f = open(path, "rb")
+        if size >= MMAP_MIN_BYTES:
+            self.data = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = self._f.read()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _skip_lines(data, pos, count):
+    """Advance *pos* past *count* newlines; returns the new position (or len(data))."""
+    for _ in range(count):
+        nl = data.find(b"\n", pos)
+        if nl < 0:
+            return len(data)
+        pos = nl + 1
+    return pos
+
+
+def read_range(path, offset=None, length=None, start_line=None, end_line=None,
+               max_bytes=MAX_READ_BYTES, cursor=None, display_path=None):
+    """
+    Read part of *path*.  Returns a dict with text, start/end byte offsets,
+    size, binary, truncated, and next_cursor (None when the range was fully read).
+    """
+    st = os.stat(path)
+    size = st.st_size
+    line = None
+    note = None
+    if cursor:
+        state = decode_cursor(cursor)
+        offset, line = state["o"], state.get("l")
+        length = state["e"] - state["o"]
+        start_line = end_line = None
+        if state.get("m") != st.st_mtime_ns:
+            note = "file changed since this cursor was issued"
+    result = {"path": display_path or path, "size": size, "binary": False,
+              "truncated": False, "next_cursor": None, "note": note}
+    if size == 0:
+        return dict(result, text="", start=0, end=0)
+
+    with _View(path, size) as view:
+        data = view.data
+        if b"\0" in data[:BINARY_SNIFF_BYTES]:
+            return dict(result, text="", start=0, end=0, binary=True)
+
+        # Resolve the requested range to byte offsets
+        if start_line is not None or end_line is not None:
+            line = max(1, start_line or 1)
+            start = _skip_lines(data, 0, line - 1)
+            end = _skip_lines(data, start, end_line - line + 1) if end_line else size
+        else:
+            start = max(0, min(offset or 0, size))
+            end = size if length is None else min(size, start + max(0, length))
+
+        # Apply the cap, cutting on a line boundary where possible
+        capped = min(end, start + max_bytes)
+        if capped < end:
+            nl = data.rfind(b"\n", start, capped)
+            if nl >= start:
+                capped = nl + 1
+        text = bytes(data[start:capped]).decode("utf-8", errors="replace")
+        next_line = line + text.count("\n") if line is not None else None
+
+    result.update(text=text, start=start, end=capped, start_line=line)
+    if capped < end:
+        result["truncated"] = True
+        result["next_cursor"] = encode_cursor(display_path or path, capped, end, next_line,
+                                              st.st_mtime_ns)
+    return result
+
+
+def format_read(result) -> str:
+    """Render a read_range() result as tool output text."""
+    if result["binary"]:
+        return f"[BINARY FILE] {result['path']} ({result['size']} bytes) - not shown"
+    text = result["text"]
+    if result.get("note"):
+        text = f"[NOTE] {result['note']}\n" + text
+    if result["truncated"]:
+        text += (f"\n[... truncated at byte {result['end']} of {result['size']}; "
+                 f"continue with cursor=\"{result['next_cursor']}\"]")
+    return text
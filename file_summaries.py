@@ -0,0 +1,151 @@
+# file_summaries.py
+"""
+Cache of short per-file summaries and symbol lists for retrieval prompts.
+
+Entries are keyed by content hash (the sha256 from the FileIndex), so
+renamed or copied files reuse their summary and only changed content is
+re-summarized.  The summary comes from the local LLM (from the head of
+the file).  The symbol list is extracted without the LLM: with ``ast`` for
+Python, and a regex for other common languages.
+
+A background thread fills the cache a few files at a time, so ranking
+and context prompts can show one compact line per file instead of raw content.
+"""
+
+import ast
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from file_index import FILE_INDEX_DB
+from local_llm import call_local_model
+
+# === CONFIG ===
+SUMMARY_INPUT_CHARS = 4000      # head of the file shown to the LLM
+MAX_SYMBOLS = 30
+SUMMARY_BATCH = 8               # files summarized per background pass
+SUMMARY_INTERVAL = 60.0         # seconds between background passes
+SUMMARIZABLE_MAX_BYTES = 2 * 1024 * 1024
+
+SUMMARY_PROMPT = """Summarize what this file ({path}) does in at most two sentences.
+Mention its main purpose and key functions or classes. Reply with the summary only.
+
+{content}
+"""
+
+_SYMBOL = re.compile(r"^\s*(?:export\s+)?(?:async\s+)?(?:def|class|function|func|fn|struct|interface|type)"
+                     r"\s+([A-Za-z_][A-Za-z0-9_]*)", re.MULTILINE)
+
+
+def extract_symbols(path: str, text: str):
+    if path.endswith(".py"):
+        try:
+            tree = ast.parse(text)
+        except (SyntaxError, ValueError):
+            pass
+        else:
+            symbols = []
+            for node in tree.body:
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    symbols.append(node.name)
+                elif isinstance(node, ast.ClassDef):
+                    symbols.append(node.name)
+                    symbols += [f"{node.name}.{n.name}" for n in node.body
+                                if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            return symbols[:MAX_SYMBOLS]
+    return list(dict.fromkeys(_SYMBOL.findall(text)))[:MAX_SYMBOLS]
+
+
+class SummaryCache:
+    def __init__(self, file_index, db_path=FILE_INDEX_DB, summarize=None):
+        self.files = file_index
+        self.summarize = summarize or (lambda path, content: call_local_model(
+            SUMMARY_PROMPT.format(path=path, content=content)).strip())
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS summaries (sha256 TEXT PRIMARY KEY, summary TEXT, "
+                        "symbols TEXT, created REAL)")
+        # Content that could not be read; skipped until the file changes
+        self.db.execute("CREATE TABLE IF NOT EXISTS summary_failures (sha256 TEXT PRIMARY KEY, path TEXT, "
+                        "error TEXT, created REAL)")
+        self.db.commit()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, sha256):
+        with self._lock:
+            row = self.db.execute("SELECT summary, symbols FROM summaries WHERE sha256 = ?",
+                                  (sha256,)).fetchone()
+        return {"summary": row[0], "symbols": json.loads(row[1])} if row else None
+
+    def for_path(self, path):
+        info = self.files.get(path)
+        return self.get(info["sha256"]) if info else None
+
+    def pending(self, limit=None):
+        """Indexed files whose current content has no summary yet."""
+        with self._lock:
+            rows = self.db.execute("SELECT f.path, f.sha256 FROM files f LEFT JOIN summaries s "
+                                   "ON f.sha256 = s.sha256 LEFT JOIN summary_failures x ON f.sha256 = x.sha256 "
+                                   "WHERE f.base = ? AND s.sha256 IS NULL AND x.sha256 IS NULL "
+                                   "AND f.size <= ? ORDER BY f.mtime_ns DESC" + (" LIMIT ?" if limit else ""),
+                                   (self.files.base_dir, SUMMARIZABLE_MAX_BYTES) + ((limit,) if limit else ()))
+            return rows.fetchall()
+
+    def summarize_file(self, path, sha256):
+        """Summarize one file; returns None (and marks it failed) if it cannot be read."""
+        full = os.path.join(self.files.base_dir, path)
+        try:
+            with open(full, "rb") as f:
+                raw = f.read()
+        except OSError as e:
+            with self._lock:
+                self.db.execute("INSERT OR REPLACE INTO summary_failures VALUES (?, ?, ?, ?)",
+                                (sha256, path, str(e), time.time()))
+                self.db.commit()
+            print(f"[Summaries] Skipping unreadable {path}: {e}")
+            return None
+        if b"\0" in raw[:8192]:
+            summary, symbols = "Binary file.", []
+        else:
+            text = raw.decode("utf-8", errors="replace")
+            symbols = extract_symbols(path, text)
+            summary = self.summarize(path, text[:SUMMARY_INPUT_CHARS])
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)",
+                            (sha256, summary, json.dumps(symbols), time.time()))
+            self.db.commit()
+        return {"summary": summary, "symbols": symbols}
+
+    def run_pass(self, batch=SUMMARY_BATCH):
+        done = 0
+        for path, sha256 in self.pending(limit=batch):
+            try:
+                if self.summarize_file(path, sha256) is not None:
+                    done += 1
+            except Exception as e:
+                # File errors are handled per file above, so this is the LLM
+                print(f"[Summaries] Could not summarize {path}: {e}")
+                break  # LLM likely unavailable; try again next pass
+        if done:
+            print(f"[Summaries] Summarized {done} files.")
+        return done
+
+    # ---- background ------------------------------------------------------- #
+    def _loop(self, interval):
+        while not self._stop.wait(interval):
+            self.run_pass()
+
+    def start(self, interval=SUMMARY_INTERVAL):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, args=(interval,), daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
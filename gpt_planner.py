@@ -68,7 +68,8 @@ def run_planner(user_input):
     print("[Planner] Asking GPT for plan...")
     plan = ask_gpt_for_plan(user_input)
     if plan:
-        execute_plan(plan)
+        results = execute_plan(plan)
+        recaller.record_execution(user_input, plan, results)
     else:
         print("[Planner] GPT did not return a valid plan.")
 
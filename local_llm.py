@@ -0,0 +1,30 @@
+import json
+import urllib.error
+import urllib.request
+
+# Same GPT4All / OpenAI-compatible endpoint as llm_client, but blocking,
+# for the synchronous filter scripts (training_filter, debate_filter).
+API_URL = "http://localhost:4891/v1/chat/completions"
+TIMEOUT = 600
+
+def call_local_model(prompt: str, model: str = "llama3:8b") -> str:
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": "You are a helpful AI assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.5,
+        "stream": False
+    }
+    request = urllib.request.Request(
+        API_URL,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=TIMEOUT) as resp:
+            result = json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"Local LLM error {e.code}: {e.read().decode(errors='replace')}")
+    return result["choices"][0]["message"]["content"]
@@ -1,74 +1,102 @@
 import os
 import json
-from llm_client import call_local_model
+from file_index import FileIndex
+from chunk_index import ChunkIndex, rerank
+from file_summaries import SummaryCache
+from file_reader import MAX_READ_BYTES, MAX_TOTAL_BYTES, decode_cursor, format_read, read_range
 
 BASE_DIR = os.path.expanduser("~/Desktop/AGI_in_A_box_v2/legacy_modules")
+RERANK_CANDIDATES = 20   # BM25 short list handed to the local LLM reranker
+SUMMARIZE_IN_BACKGROUND = True
 
-def search_local_files(query: str, top_k: int = 5) -> str:
-    """
-    1) Walk BASE_DIR and list all file paths.
-    2) Ask the local LLM to rank the most relevant files for `query`.
-    3) Read those top_k files and return a JSON blob: { path: content }.
-    """
-    # 1) gather file list
-    all_files = []
-    for root, _, files in os.walk(BASE_DIR):
-        for fn in files:
-            all_files.append(os.path.relpath(os.path.join(root, fn), BASE_DIR))
+_file_index = None
+_chunk_index = None
+_summaries = None
 
-    # 2) prompt local LLM to pick top_k
-    prompt = {
-        "role": "system",
-        "content": (
-            "You are a file-retrieval assistant. "
-            f"Given the user query: “{query}”, rank the following files "
-            "in order of relevance, and output a JSON list of the top "
-            f"{top_k} file paths. List only paths, nothing else.\n\n"
-            + "\n".join(all_files)
-        )
-    }
-    resp = call_local_model([prompt])
-    try:
-        candidates = json.loads(resp)
-        if not isinstance(candidates, list):
-            raise ValueError
-    except Exception:
-        candidates = all_files[:top_k]
+def get_file_index() -> FileIndex:
+    """Persistent index of BASE_DIR, refreshed by mtime diffing at most every REFRESH_INTERVAL."""
+    global _file_index
+    if _file_index is None:
+        _file_index = FileIndex(BASE_DIR)
+    _file_index.refresh_if_stale()
+    return _file_index
 
-    # 3) read and return contents
-    result = {}
-    for path in candidates:
-        full = os.path.join(BASE_DIR, path)
-        try:
-            with open(full, "r") as f:
-                result[path] = f.read()
-        except Exception as e:
-            result[path] = f"[ERROR reading file: {e}]"
+def get_chunk_index() -> ChunkIndex:
+    """BM25 index over line-window chunks of BASE_DIR; re-chunks only changed files."""
+    global _chunk_index
+    if _chunk_index is None:
+        _chunk_index = ChunkIndex(get_file_index())
+    _chunk_index.sync()
+    return _chunk_index
+
+def get_summary_cache() -> SummaryCache:
+    """Per-file LLM summaries keyed by content hash, filled by a background thread."""
+    global _summaries
+    if _summaries is None:
+        _summaries = SummaryCache(get_file_index())
+        if SUMMARIZE_IN_BACKGROUND:
+            _summaries.start()
+    return _summaries
 
-    return json.dumps(result, indent=2)
+def _attach_summaries(hits):
+    cache = get_summary_cache()
+    for hit in hits:
+        cached = cache.for_path(hit["path"])
+        if cached:
+            hit["file_summary"] = cached["summary"]
+            hit["symbols"] = cached["symbols"]
+    return hits
 
-def read_file(path: str) -> str:
+def search_local_files(query: str, top_k: int = 5, rerank_llm: bool = True) -> str:
     """
-    Return the raw contents of a file under BASE_DIR.
+    1) Retrieve the top RERANK_CANDIDATES chunks for `query` with BM25.
+    2) Optionally ask the local LLM to rerank that short list (using cached file summaries).
+    3) Return a JSON list of the top_k snippets: [{path, start_line, end_line, score, snippet}],
+       plus file_summary/symbols for files that have been summarized.
     """
+    hits = _attach_summaries(get_chunk_index().search(query, top_n=RERANK_CANDIDATES))
+    if rerank_llm and len(hits) > top_k:
+        hits = rerank(query, hits, top_k)
+    # Keep the tool output within MAX_TOTAL_BYTES across all snippets
+    budget = MAX_TOTAL_BYTES
+    for hit in hits[:top_k]:
+        hit["snippet"] = hit["snippet"].encode("utf-8")[:max(0, budget)].decode("utf-8", errors="ignore")
+        budget -= len(hit["snippet"].encode("utf-8"))
+    return json.dumps(hits[:top_k])
+
+def read_file(path: str = None, start_line: int = None, end_line: int = None,
+              offset: int = None, length: int = None, cursor: str = None,
+              max_bytes: int = MAX_READ_BYTES) -> str:
+    """
+    Return part of a file under BASE_DIR, capped at max_bytes.
+    Select by line range (1-based, inclusive) or byte offset/length; a
+    truncated read ends with a cursor to pass back for the next page.
+    """
+    if cursor:
+        try:
+            path = decode_cursor(cursor)["p"]
+        except (ValueError, KeyError) as e:
+            return f"[ERROR] {e}"
+    if not path:
+        return "[ERROR] read_file needs a path or a cursor"
     full = path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
-    if not os.path.exists(full):
+    if not os.path.isfile(full):
         return f"[ERROR] File not found: {path}"
-    with open(full, "r") as f:
-        return f.read()
+    try:
+        result = read_range(full, offset=offset, length=length, start_line=start_line,
+                            end_line=end_line, max_bytes=min(max_bytes, MAX_TOTAL_BYTES),
+                            cursor=cursor, display_path=path)
+    except (OSError, ValueError) as e:
+        return f"[ERROR reading file: {e}]"
+    return format_read(result)
 
-def search_localdocs(query: str) -> str:
+def search_localdocs(query: str, top_k: int = 5) -> str:
     """
-    Use GPT4All’s built-in LocalDocs index to fetch
-    relevant snippets for `query`.
+    Fetch relevant snippets for `query` from our own chunk index
+    (replaces GPT4All's LocalDocs), as plain text (no JSON).
     """
-    messages = [
-        {"role": "system", "content": (
-            "You have access to a LocalDocs index of the entire codebase. "
-            "Given the user query, return the most relevant file snippets "
-            "or document excerpts, in plain text (no JSON)."
-        )},
-        {"role": "user", "content": query}
-    ]
-    return call_local_model(messages)
-
+    hits = get_chunk_index().search(query, top_n=top_k)
+    if not hits:
+        return "[No matching snippets]"
+    return "\n\n".join(f"--- {h['path']}:{h['start_line']}-{h['end_line']}\n{h['snippet']}"
+                       for h in hits)
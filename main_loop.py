@@ -6,26 +6,37 @@ from executor import execute_plan
 from retry_handler import RetryHandler
 from feedback_logger import FeedbackLogger
 from tool_call_router import AGENT  # ← import your registry
+from memory_archiver import MemoryArchiver
+from context_assembler import (ContextAssembler, DEFAULT_BUDGET, goal_source,
+                               memory_source, result_source, tool_source)
+
+TOOLS = AGENT
 
 class MainLoop:
-    def __init__(self):
+    def __init__(self, context_budget=DEFAULT_BUDGET):
         self.retry_handler = RetryHandler()
         self.logger = FeedbackLogger()
+        self.archiver = MemoryArchiver()
+        # Only the most valuable goals/memories/results/tools per token reach the prompt
+        self.context = ContextAssembler([
+            goal_source(TOOLS["get_goals"]),
+            memory_source(self.archiver),
+            result_source(self.logger),
+            tool_source(TOOLS),
+        ], budget=context_budget)
 
     def run_once(self, user_input: str):
         # 0) Persist the user’s goal (safe–guarded)
         try:
-            ack = TOOLS["log_goal"](user_input)
+            ack = TOOLS["log_goals"](user_input)
         except Exception as e:
             ack = f"[Error] log_goal failed: {e}"
         print(ack)
 
-        # 1) Fetch all goals so far (safe–guarded)
-        try:
-            current = TOOLS["get_goals"]()
-        except Exception as e:
-            current = f"[Error] get_goals failed: {e}"
-        print(f"[GoalManager] Goals so far:\n{current}")
+        # 1) Assemble goals, memories, recent results and tools within the token budget
+        context, stats = self.context.assemble(user_input)
+        print(f"[MainLoop] Context: {stats['selected']}/{stats['candidates']} items, "
+              f"{stats['tokens']}/{stats['budget']} tokens")
 
         # 2) Build the chat history
         convo = [
@@ -33,7 +44,7 @@ class MainLoop:
             {
                 "role": "assistant",
                 "name": "agents",
-                "content": get_goals(current)
+                "content": context
             },
             {"role": "user",      "content": user_input},
         ]
@@ -1,50 +1,114 @@
 import os
-import json
+import threading
 from datetime import datetime
+from memory_compactor import MemoryCompactor, MAX_ENTRIES
+from memory_index import InvertedIndex
+from memory_store import MemoryStore, entry_key
 
 class MemoryArchiver:
     """
     Stores successful command patterns and their outcomes as reusable memory.
     Prevents redundant GPT calls and enables offline reuse.
     """
-    def __init__(self, archive_path="memory_archive.json"):
+    def __init__(self, archive_path="memory_archive.json", index_path=None,
+                 max_entries=MAX_ENTRIES, background_compaction=False):
         self.archive_path = archive_path
-        self.memory = self._load_archive()
+        # Entries live in an append-only, deduplicated log; a legacy
+        # memory_archive.json is imported into it the first time.
+        base = os.path.splitext(archive_path)[0]
+        self.store_path = base + ".jsonl"
+        legacy = archive_path if archive_path != self.store_path else None
+        self.store = MemoryStore(self.store_path, legacy_path=legacy)
+        self.memory = dict(self.store.items())   # entry key -> entry
+        # The search index lives next to the archive.  Its doc ids are entry
+        # keys, so comparing key sets on open repairs an index left behind
+        # by a crash between a store write and the index update.
+        self.index_path = index_path or base + ".index.jsonl"
+        self.index = InvertedIndex(self.index_path)
+        self._sync_index()
+        # Compaction merges/evicts low-value entries; the in-memory map and
+        # the index are brought back in step under the lock.
+        self._lock = threading.RLock()
+        self.compactor = MemoryCompactor(self.store, max_entries=max_entries,
+                                         on_change=self._reload)
+        if background_compaction:
+            self.compactor.start()
 
-    def _load_archive(self):
-        if os.path.exists(self.archive_path):
-            with open(self.archive_path, "r") as f:
-                return json.load(f)
-        return []
+    def _sync_index(self):
+        if any(key not in self.memory for key in self.index.doc_lengths):
+            self.index.rebuild(self.memory)   # drops must rewrite the file, not append to it
+        else:
+            self.index.sync(self.memory)
+
+    def _reload(self):
+        with self._lock:
+            self.memory = dict(self.store.items())
+            self._sync_index()
+
+    def compact(self):
+        """Run one compaction pass now; returns its stats."""
+        return self.compactor.run_pass()
+
+    def _append(self, entries):
+        with self._lock:
+            for mem in self.store.add_many(entries):
+                key = entry_key(mem)
+                self.memory[key] = mem
+                self.index.add(key, mem)
+
+    def add(self, text, tags=None, importance=0.5, certainty=0.8):
+        """Store a free-form note (lets the archiver serve as AgentInterface.memory)."""
+        self._append([{
+            "type": "note",
+            "text": text,
+            "tags": tags or [],
+            "importance": importance,
+            "certainty": certainty,
+            "timestamp": datetime.now().isoformat()
+        }])
 
     def archive_successes(self, log):
+        """
+        Archive successful actions from an executor log.  Only entries not seen
+        before are written and indexed; repeats just bump hit_count/last_seen.
+        """
+        candidates = []
         for entry in log:
             if entry["action"] == "shell" and entry["result"].get("code", 1) == 0:
-                self.memory.append({
+                candidates.append({
                     "type": "shell",
                     "command": entry["target"],
                     "output": entry["result"].get("stdout", "")[:500],
                     "timestamp": entry["timestamp"]
                 })
             elif entry["action"] == "file_patch":
-                self.memory.append({
+                candidates.append({
                     "type": "file",
                     "file": entry["target"],
                     "timestamp": entry["timestamp"]
                 })
-        self._save()
-
-    def _save(self):
-        with open(self.archive_path, "w") as f:
-            json.dump(self.memory, f, indent=2)
+        self._append(candidates)
 
-    def search_memory(self, query: str):
-        results = []
-        for mem in self.memory:
-            if query.lower() in json.dumps(mem).lower():
-                results.append(mem)
+    def search_memory(self, query: str, top_k=None, record: bool = True):
+        """
+        BM25-ranked search over commands, outputs, file paths and summaries.
+        Supports "quoted phrases" and prefix* terms; returns every match, best
+        first, or only the top_k when given.
+        With record=False the caller is expected to record_recall() the
+        memories it actually uses.
+        """
+        with self._lock:
+            results = [self.memory[key] for key, _ in self.index.search(query, top_k)
+                       if key in self.memory]
+        if record:
+            self.record_recall(results)
         return results
 
+    def record_recall(self, memories):
+        """Count *memories* as recalled; recall counts feed the compaction score."""
+        if memories:
+            self.store.record_recall([entry_key(mem) for mem in memories], datetime.now().isoformat())
+
 if __name__ == "__main__":
     from feedback_logger import FeedbackLogger
     logger = FeedbackLogger()
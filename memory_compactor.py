@@ -0,0 +1,186 @@
+# memory_compactor.py
+"""
+Importance-decayed compaction for the memory stores, so the archive stays
+within a fixed budget as the system ages.
+
+Every entry gets a value score:
+
+    importance * certainty * 0.5 ** (age_days / HALF_LIFE_DAYS) * usage
+
+where usage grows with hit_count (archived again) and recall_count (returned
+by a search), and age counts from the most recent of last_seen/last_recalled.
+Each pass then:
+
+  1. takes the lowest-value entries (at most CLUSTER_BATCH of them),
+  2. groups related ones by embedding similarity and asks the local LLM to
+     merge each group into one "summary" entry (MAX_MERGES_PER_PASS per pass),
+  3. evicts the lowest-value entries while the store is over max_entries.
+
+Passes are small and can run on a background thread at a fixed interval.
+"""
+
+import math
+import threading
+from datetime import datetime
+
+import embeddings
+from local_llm import call_local_model
+
+# === CONFIG ===
+DEFAULT_IMPORTANCE = 0.5
+DEFAULT_CERTAINTY = 0.8
+HALF_LIFE_DAYS = 14.0
+RECALL_WEIGHT = 2.0          # a search hit counts as much as two re-archivals
+LOW_VALUE_SCORE = 0.1        # entries below this are candidates for merging
+CLUSTER_BATCH = 256
+CLUSTER_SIMILARITY = 0.6
+MIN_CLUSTER_SIZE = 3
+MAX_MERGES_PER_PASS = 4
+SUMMARY_CERTAINTY = 0.9      # summaries are a little less certain than their sources
+MAX_ENTRIES = 5000
+PASS_INTERVAL = 300          # seconds between background passes
+
+SUMMARY_PROMPT = """The following memory entries from an autonomous agent are related.
+Merge them into ONE short memory (at most 3 sentences) that keeps every
+command, file path and outcome worth remembering. Reply with the memory text only.
+
+{entries}
+"""
+
+
+def entry_text(entry: dict) -> str:
+    if entry.get("type") == "shell":
+        return f"$ {entry.get('command', '')}\n{entry.get('output', '')}"
+    if entry.get("type") == "file":
+        return f"file {entry.get('file', '')}: {entry.get('summary') or entry.get('content', '')[:200]}"
+    return entry.get("summary") or entry.get("text") or ""
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def entry_age_days(entry: dict, now=None) -> float:
+    now = now or datetime.now()
+    stamps = [_parse_time(entry.get(f)) for f in ("last_recalled", "last_seen", "timestamp")]
+    stamps = [s for s in stamps if s is not None]
+    if not stamps:
+        return 0.0
+    return max(0.0, (now - max(stamps)).total_seconds() / 86400)
+
+
+def score_entry(entry: dict, now=None) -> float:
+    importance = entry.get("importance", DEFAULT_IMPORTANCE)
+    certainty = entry.get("certainty", DEFAULT_CERTAINTY)
+    recency = 0.5 ** (entry_age_days(entry, now) / HALF_LIFE_DAYS)
+    uses = max(0, entry.get("hit_count", 1) - 1) + RECALL_WEIGHT * entry.get("recall_count", 0)
+    return importance * certainty * recency * (1 + math.log1p(uses))
+
+
+def cluster_entries(items, similarity=CLUSTER_SIMILARITY):
+    """Greedy single-pass clustering of (key, entry) pairs by embedding cosine."""
+    vectors = embeddings.embed_texts([entry_text(e) for _, e in items])
+    clusters = []   # [leader_vector, [(key, entry), ...]]
+    for item, vec in zip(items, vectors):
+        for cluster in clusters:
+            if embeddings.cosine(cluster[0], vec) >= similarity:
+                cluster[1].append(item)
+                break
+        else:
+            clusters.append([vec, [item]])
+    return [members for _, members in clusters]
+
+
+def summarize_with_local_llm(texts):
+    entries = "\n\n".join(f"- {t}" for t in texts)
+    return call_local_model(SUMMARY_PROMPT.format(entries=entries)).strip()
+
+
+def merge_entries(members, summary):
+    """Build the summary entry that replaces a cluster of (key, entry) pairs."""
+    entries = [e for _, e in members]
+    newest = max((e.get("last_seen") or e.get("timestamp") or "" for e in entries), default="")
+    return {
+        "type": "summary",
+        "summary": summary,
+        "sources": [e.get("command") or e.get("file") or e.get("summary", "")[:80] for e in entries][:20],
+        "merged": sum(e.get("merged", 1) for e in entries),
+        "importance": max(e.get("importance", DEFAULT_IMPORTANCE) for e in entries),
+        "certainty": SUMMARY_CERTAINTY * sum(e.get("certainty", DEFAULT_CERTAINTY) for e in entries) / len(entries),
+        "hit_count": sum(e.get("hit_count", 1) for e in entries),
+        "recall_count": sum(e.get("recall_count", 0) for e in entries),
+        "timestamp": datetime.now().isoformat(),
+        "last_seen": newest or None,
+    }
+
+
+class MemoryCompactor:
+    """
+    Runs compaction passes over a MemoryStore.  `summarize` maps a list of
+    entry texts to one summary string (local LLM by default); `on_change` is
+    called after a pass that merged or evicted anything.
+    """
+    def __init__(self, store, max_entries=MAX_ENTRIES, summarize=None, on_change=None):
+        self.store = store
+        self.max_entries = max_entries
+        self.summarize = summarize or summarize_with_local_llm
+        self.on_change = on_change
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_pass(self):
+        now = datetime.now()
+        scored = sorted(((score_entry(e, now), key, e) for key, e in self.store.items()),
+                        key=lambda t: t[0])
+        stats = {"entries": len(scored), "merged": 0, "summaries": 0, "evicted": 0}
+
+        # 1-2. Merge clusters of related low-value entries
+        low = [(key, e) for score, key, e in scored[:CLUSTER_BATCH] if score < LOW_VALUE_SCORE]
+        clusters = [c for c in cluster_entries(low) if len(c) >= MIN_CLUSTER_SIZE] if low else []
+        for members in clusters[:MAX_MERGES_PER_PASS]:
+            try:
+                summary = self.summarize([entry_text(e) for _, e in members])
+            except Exception as e:
+                print(f"[Compactor] Summary failed, keeping {len(members)} entries: {e}")
+                continue
+            if not summary:
+                continue
+            self.store.replace([key for key, _ in members], [merge_entries(members, summary)])
+            stats["merged"] += len(members)
+            stats["summaries"] += 1
+
+        # 3. Evict the lowest-value entries while over budget
+        over = len(self.store) - self.max_entries
+        if over > 0:
+            ranked = sorted(self.store.items(), key=lambda kv: score_entry(kv[1], now))
+            self.store.replace([key for key, _ in ranked[:over]])
+            stats["evicted"] = over
+
+        if (stats["merged"] or stats["evicted"]) and self.on_change:
+            self.on_change()
+        if stats["merged"] or stats["evicted"]:
+            print(f"[Compactor] Merged {stats['merged']} entries into {stats['summaries']} "
+                  f"summaries, evicted {stats['evicted']} ({len(self.store)} left).")
+        return stats
+
+    # ---- background ------------------------------------------------------- #
+    def _loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.run_pass()
+            except Exception as e:
+                print(f"[Compactor] Pass failed: {e}")
+
+    def start(self, interval=PASS_INTERVAL):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, args=(interval,), daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
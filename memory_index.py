@@ -0,0 +1,209 @@
+# memory_index.py
+"""
+Incrementally maintained inverted index with BM25 ranking, used by
+MemoryArchiver.search_memory instead of re-serializing every memory per query.
+
+Indexed fields: command, output, file, summary (plus content/text when present).
+Postings keep token positions, which allows phrase queries.
+
+Query syntax:
+    pip install            -> BM25 over either term
+    "pip install numpy"    -> phrase: the terms must appear consecutively
+    instal*                -> prefix: expands to every indexed term starting with "instal"
+
+Persistence is an append-only JSONL file (one line per indexed document), so
+adding entries costs only the new entries, never a rewrite of the index.
+"""
+
+import bisect
+import heapq
+import json
+import math
+import os
+import re
+from collections import defaultdict
+
+# === CONFIG ===
+INDEXED_FIELDS = ["command", "output", "file", "summary", "content", "text"]
+FIELD_GAP = 10          # position gap between fields so phrases never span two fields
+MAX_PREFIX_EXPANSION = 64
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9_]+")
+_QUERY = re.compile(r'"([^"]+)"|(\S+)')
+
+
+def tokenize(text: str):
+    return _TOKEN.findall(text.lower())
+
+
+class InvertedIndex:
+    def __init__(self, path=None):
+        self.path = path
+        self.postings = defaultdict(dict)   # term -> {doc_id: [positions]}
+        self.doc_lengths = {}               # doc_id -> token count
+        self.doc_terms = {}                 # doc_id -> [terms]; lets remove() skip the vocabulary
+        self.total_length = 0
+        self._sorted_terms = None
+        if path and os.path.exists(path):
+            self._load()
+
+    # ---- building --------------------------------------------------------- #
+    def _load(self):
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line after a crash; that doc is re-added on sync
+                self._insert(entry["doc"], entry["len"], entry["terms"])
+
+    def _insert(self, doc_id, length, terms):
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        for term, positions in terms.items():
+            self.postings[term][doc_id] = positions
+        self.doc_terms[doc_id] = list(terms)
+        self._sorted_terms = None
+
+    @staticmethod
+    def _analyze(mem: dict):
+        terms = defaultdict(list)
+        pos = 0
+        for field in INDEXED_FIELDS:
+            value = mem.get(field)
+            if not isinstance(value, str):
+                continue
+            for token in tokenize(value):
+                terms[token].append(pos)
+                pos += 1
+            pos += FIELD_GAP
+        length = sum(len(p) for p in terms.values())
+        return length, dict(terms)
+
+    def add(self, doc_id, mem: dict, persist=True):
+        length, terms = self._analyze(mem)
+        self._insert(doc_id, length, terms)
+        if persist and self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"doc": doc_id, "len": length, "terms": terms}) + "\n")
+
+    def remove(self, doc_id):
+        length = self.doc_lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in self.doc_terms.pop(doc_id, ()):
+            docs = self.postings.get(term)
+            if docs is not None and docs.pop(doc_id, None) is not None and not docs:
+                del self.postings[term]
+        self._sorted_terms = None
+
+    def terms_of(self, doc_id) -> dict:
+        """{term: positions} for one indexed document, as persisted."""
+        return {term: self.postings[term][doc_id] for term in self.doc_terms.get(doc_id, ())}
+
+    def sync(self, docs):
+        """
+        Bring the index in line with *docs* ({doc_id: memory}): index what is
+        missing and drop documents that are gone.  Returns (added, removed).
+        Drops are not persisted; call rebuild() to rewrite the file.
+        """
+        removed = [doc_id for doc_id in self.doc_lengths if doc_id not in docs]
+        for doc_id in removed:
+            self.remove(doc_id)
+        added = 0
+        for doc_id, mem in docs.items():
+            if doc_id not in self.doc_lengths:
+                self.add(doc_id, mem)
+                added += 1
+        return added, len(removed)
+
+    def rebuild(self, docs):
+        """Re-index *docs* ({doc_id: memory}) from scratch and rewrite the file."""
+        self.postings.clear()
+        self.doc_lengths.clear()
+        self.doc_terms.clear()
+        self.total_length = 0
+        self._sorted_terms = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        for doc_id, mem in docs.items():
+            self.add(doc_id, mem)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    # ---- querying --------------------------------------------------------- #
+    def _expand_prefix(self, prefix):
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.postings)
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        out = []
+        for term in self._sorted_terms[start:start + MAX_PREFIX_EXPANSION]:
+            if not term.startswith(prefix):
+                break
+            out.append(term)
+        return out
+
+    def _phrase_docs(self, terms):
+        if not terms or any(t not in self.postings for t in terms):
+            return set()
+        # Intersect starting from the rarest term to keep candidate sets small
+        by_rarity = sorted(set(terms), key=lambda t: len(self.postings[t]))
+        docs = set(self.postings[by_rarity[0]])
+        for term in by_rarity[1:]:
+            docs &= self.postings[term].keys()
+        matched = set()
+        for doc in docs:
+            following = [set(self.postings[t][doc]) for t in terms[1:]]
+            for start in self.postings[terms[0]][doc]:
+                if all(start + i + 1 in positions for i, positions in enumerate(following)):
+                    matched.add(doc)
+                    break
+        return matched
+
+    def _bm25(self, term, scores, restrict=None):
+        docs = self.postings.get(term)
+        if not docs:
+            return
+        n = len(self.doc_lengths)
+        avg_len = self.total_length / n if n else 0
+        idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+        for doc, positions in docs.items():
+            if restrict is not None and doc not in restrict:
+                continue
+            tf = len(positions)
+            norm = 1 - BM25_B + BM25_B * (self.doc_lengths[doc] / avg_len if avg_len else 1)
+            scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+
+    def search(self, query: str, top_k=10):
+        """Return [(doc_id, score)] best first."""
+        terms, phrases = [], []
+        for phrase, word in _QUERY.findall(query.lower()):
+            if phrase:
+                tokens = tokenize(phrase)
+                if tokens:
+                    phrases.append(tokens)
+            elif word.endswith("*") and tokenize(word):
+                terms.extend(self._expand_prefix(tokenize(word)[0]))
+            else:
+                terms.extend(tokenize(word))
+
+        restrict = None
+        for tokens in phrases:
+            docs = self._phrase_docs(tokens)
+            restrict = docs if restrict is None else restrict & docs
+            terms.extend(tokens)
+        if restrict is not None and not restrict:
+            return []
+
+        scores = {}
+        for term in set(terms):
+            self._bm25(term, scores, restrict)
+        if top_k:
+            return heapq.nsmallest(top_k, scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        return sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
@@ -1,41 +1,192 @@
 import os
-from datetime import datetime
+import json
 import uuid
+import atexit
+import shlex
+import threading
+import subprocess
+from datetime import datetime
 
 # === CONFIG ===
 LOCALDOCS_PATH = "/home/sentinel/.var/app/io.gpt4all.gpt4all/data/nomic.ai/GPT4All/docs"
+MANIFEST_FILE = ".memory_manifest.json"   # dotfile so LocalDocs doesn't index it
+SEGMENT_PREFIX = "memory_segment"
+SEGMENT_MAX_BYTES = 256 * 1024            # roll over to a new segment past this size
+FLUSH_MAX_ENTRIES = 32                    # flush once this many memories are buffered...
+FLUSH_INTERVAL = 2.0                      # ...or this many seconds after the first one
+REINDEX_COMMAND = os.getenv("LOCALDOCS_REINDEX_CMD", "")  # gets changed segment paths appended
 
 def sanitize_filename(text: str) -> str:
     return "".join(c if c.isalnum() or c in "-_" else "_" for c in text.lower())
 
-def store_memory(role: str, content: str, tags=None):
-    tags = tags or []
-    timestamp = datetime.utcnow().isoformat()
-    entry_id = str(uuid.uuid4())[:8]
-    tag_str = ", ".join(tags)
-    
-    filename = f"{timestamp[:10]}_{sanitize_filename(role)}_{entry_id}.md"
-    full_path = os.path.join(LOCALDOCS_PATH, filename)
-    
-    memory_block = f"""# Memory Entry ({entry_id})
-**Role:** {role}  
-**Timestamp:** {timestamp}  
-**Tags:** {tag_str}  
+def format_entry(entry_id, role, timestamp, tags, content):
+    return f"""<a id="mem-{entry_id}"></a>
+# Memory Entry ({entry_id})
+**Role:** {role}
+**Timestamp:** {timestamp}
+**Tags:** {", ".join(tags)}
 
 ---
 
 {content}
+
 """
 
-    with open(full_path, "w") as f:
-        f.write(memory_block)
-    
-    print(f"[MemoryLogger] Stored memory: {filename}")
-    return full_path
+class SegmentWriter:
+    """
+    Appends memories to rolling Markdown segments instead of one file each.
+    Entries are buffered and written in batches (one fsync per batch); the
+    manifest records every segment touched since the last reindex.
+    """
+    def __init__(self, docs_path=LOCALDOCS_PATH, max_bytes=SEGMENT_MAX_BYTES,
+                 flush_entries=FLUSH_MAX_ENTRIES, flush_interval=FLUSH_INTERVAL):
+        self.docs_path = docs_path
+        self.max_bytes = max_bytes
+        self.flush_entries = flush_entries
+        self.flush_interval = flush_interval
+        self.manifest_path = os.path.join(docs_path, MANIFEST_FILE)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self.manifest = self._load_manifest()
+
+    # ---- manifest --------------------------------------------------------- #
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        return {"current": None, "segments": {}, "changed": [], "last_index": None}
+
+    def _save_manifest(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def _segment_for(self, size):
+        current = self.manifest["current"]
+        if current:
+            info = self.manifest["segments"][current]
+            if info["bytes"] == 0 or info["bytes"] + size <= self.max_bytes:
+                return current
+        day = datetime.utcnow().strftime("%Y-%m-%d")
+        seq = sum(1 for name in self.manifest["segments"] if name.startswith(f"{SEGMENT_PREFIX}_{day}_"))
+        name = f"{SEGMENT_PREFIX}_{day}_{seq:03d}.md"
+        self.manifest["segments"][name] = {"entries": 0, "bytes": 0, "created": datetime.utcnow().isoformat()}
+        self.manifest["current"] = name
+        return name
+
+    # ---- writing ---------------------------------------------------------- #
+    def add(self, role, content, tags=None):
+        """Queue a memory; returns '<segment path>#mem-<id>', stable once flushed."""
+        tags = tags or []
+        timestamp = datetime.utcnow().isoformat()
+        entry_id = str(uuid.uuid4())[:8]
+        block = format_entry(entry_id, role, timestamp, tags, content).encode("utf-8")
+        with self._lock:
+            segment = self._segment_for(len(block))
+            # Reserve the space now so the returned anchor points at the right segment
+            info = self.manifest["segments"][segment]
+            info["bytes"] += len(block)
+            info["entries"] += 1
+            self._pending.append((segment, block))
+            if len(self._pending) >= self.flush_entries:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return f"{os.path.join(self.docs_path, segment)}#mem-{entry_id}"
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        by_segment = {}
+        for segment, block in self._pending:
+            by_segment.setdefault(segment, []).append(block)
+        os.makedirs(self.docs_path, exist_ok=True)
+        for segment, blocks in by_segment.items():
+            with open(os.path.join(self.docs_path, segment), "ab") as f:
+                f.write(b"".join(blocks))
+                f.flush()
+                os.fsync(f.fileno())
+            self.manifest["segments"][segment]["updated"] = datetime.utcnow().isoformat()
+            if segment not in self.manifest["changed"]:
+                self.manifest["changed"].append(segment)
+        self._save_manifest()
+        print(f"[MemoryLogger] Flushed {len(self._pending)} memories to {len(by_segment)} segment(s).")
+        self._pending = []
+
+    # ---- reindexing ------------------------------------------------------- #
+    def changed_segments(self):
+        return [os.path.join(self.docs_path, name) for name in self.manifest["changed"]]
+
+    def reindex(self, hook=None):
+        """
+        Hand the segments changed since the last index to *hook* (a callable
+        taking a list of paths).  The changed list is cleared only if the hook
+        succeeds, so a failed reindex is retried next time.  A hook that
+        returns False did not reindex (e.g. no command configured); the
+        segments stay pending.
+        """
+        self.flush()
+        with self._lock:
+            changed = self.changed_segments()
+            if not changed:
+                print("[MemoryLogger] No segments changed since last index.")
+                return []
+            if (hook or run_reindex_command)(changed) is False:
+                return []
+            self.manifest["changed"] = []
+            self.manifest["last_index"] = datetime.utcnow().isoformat()
+            self._save_manifest()
+        print(f"[MemoryLogger] Reindexed {len(changed)} changed segment(s).")
+        return changed
+
+def run_reindex_command(paths):
+    """
+    Default reindex hook: run LOCALDOCS_REINDEX_CMD with the changed segments
+    appended.  Returns False when no command is set, so the segments stay
+    pending until one is.
+    """
+    if not REINDEX_COMMAND:
+        print("[MemoryLogger] No LOCALDOCS_REINDEX_CMD set; reindex these in the GPT4All GUI "
+              "(they stay pending until a reindex command runs):")
+        for path in paths:
+            print(f"  - {path}")
+        return False
+    subprocess.run(shlex.split(REINDEX_COMMAND) + list(paths), check=True)
+    return True
+
+_writer = None
+
+def _get_writer():
+    global _writer
+    if _writer is None:
+        _writer = SegmentWriter()
+        atexit.register(_writer.flush)
+    return _writer
+
+def store_memory(role: str, content: str, tags=None):
+    location = _get_writer().add(role, content, tags)
+    print(f"[MemoryLogger] Stored memory: {os.path.basename(location)}")
+    return location
+
+def flush_memories():
+    if _writer is not None:
+        _writer.flush()
 
-def mark_for_reindex():
-    print("[MemoryLogger] Reindex manually in GPT4All GUI or add CLI hook here.")
+def mark_for_reindex(hook=None):
+    return _get_writer().reindex(hook)
 
 # === EXAMPLE USAGE ===
 if __name__ == "__main__":
     store_memory("agent", "System initialized. AGI handoff to local LLMs begun.", tags=["agi", "init"])
+    mark_for_reindex()
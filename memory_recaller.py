@@ -1,10 +1,17 @@
 import os
+import re
 import json
 import time
 import dotenv
 import openai
+import embeddings
 from executor import Executor, execute_plan  # now valid
 
+try:
+    from embedding_store import EmbeddingStore, text_id
+except ImportError:  # numpy not installed: recall scans the cached vectors in Python
+    EmbeddingStore = None
+
 # === LOAD API KEY ===
 dotenv.load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
@@ -20,15 +27,156 @@ You are a system planner for an autonomous LLM-based computer. Your job is to:
 Respond ONLY with a list of JSON objects.
 """
 
+# === PLAN RECALL ===
+PLAN_CACHE_FILE = "plan_cache.jsonl"
+RECALL_THRESHOLD = 0.9   # cosine similarity needed to reuse a stored plan
+PLAN_VECTOR_DIR = "plan_vectors"   # memory-mapped vector index, one store per backend
+RECALL_CANDIDATES = 10
+
+
+def plan_is_wellformed(user_input, cached):
+    """Default verification hook: the stored plan must still be a usable step list."""
+    plan = cached.get("plan")
+    return isinstance(plan, list) and bool(plan) and all(
+        isinstance(step, dict) and step.get("type") in {"shell", "file"} for step in plan)
+
+
+_QUOTED = re.compile(r"\"([^\"]*)\"|'([^']*)'")
+_ARG_CHARS = re.compile(r"[\d/\\~.=]")
+
+
+def argument_tokens(text):
+    """
+    The parts of a request a plan is specific to: quoted strings plus words
+    that look like paths, file names, numbers, flags or key=value pairs.
+    """
+    args = [a or b for a, b in _QUOTED.findall(text)]
+    for word in _QUOTED.sub(" ", text).split():
+        word = word.strip(",;:!?()[]{}").rstrip(".")
+        if word and (word.startswith("-") or _ARG_CHARS.search(word)):
+            args.append(word)
+    return sorted(args)
+
+
+def arguments_match(user_input, cached):
+    """
+    Default verification hook: the request must be the stored one up to case
+    and whitespace, or name exactly the same arguments.  Similar wording is
+    not enough: "rename report_2024.txt" must not replay the 2025 plan.
+    """
+    stored = cached.get("input", "")
+    if " ".join(user_input.lower().split()) == " ".join(stored.lower().split()):
+        return True
+    return argument_tokens(user_input) == argument_tokens(stored)
+
+
+def plan_succeeded(results):
+    """True if every step result from execute_plan() reports success."""
+    if not results:
+        return False
+    for result in results:
+        if not isinstance(result, dict):
+            return False
+        if result.get("code", 0) != 0 or result.get("status") in {"error", "waiting"}:
+            return False
+    return True
+
+
 class MemoryRecaller:
     """
-    Placeholder for memory-based plan recall.
-    Replace recall_plan() with your vector-search or DB lookup logic.
+    Semantic plan cache.  Every successfully executed plan is stored with an
+    embedding of the user input that produced it; a new request whose
+    similarity to a stored one reaches `threshold` gets that plan back
+    without calling GPT.  `verify` hooks (callables taking
+    (user_input, cached_entry) -> bool) can veto a match; by default the plan
+    must be well-formed and the request must name the same arguments.
+    With numpy available the vectors are also kept in an EmbeddingStore, so
+    a lookup is one matrix-vector product instead of a Python loop.
     """
+    def __init__(self, cache_path=PLAN_CACHE_FILE, threshold=RECALL_THRESHOLD, verify=None,
+                 vector_dir=PLAN_VECTOR_DIR):
+        self.cache_path = cache_path
+        self.threshold = threshold
+        self.verify = list(verify) if verify is not None else [plan_is_wellformed, arguments_match]
+        self.backend = embeddings.backend_name()
+        self.entries = self._load()
+        self.store = self._open_store(vector_dir)
+
+    def _open_store(self, vector_dir):
+        if EmbeddingStore is None or not vector_dir:
+            return None
+        store = EmbeddingStore(os.path.join(vector_dir, self.backend), backend=self.backend)
+        self._by_id = {self._entry_id(e["input"]): e for e in self.entries}
+        # The JSONL cache is the source of truth; index whatever the store lacks
+        missing = [item_id for item_id in self._by_id if item_id not in store]
+        if missing:
+            store.add(missing, [self._by_id[item_id]["vector"] for item_id in missing])
+        return store
+
+    def _entry_id(self, user_input):
+        return text_id(user_input.strip().lower(), self.backend)
+
+    def _ranked(self, query):
+        """[(similarity, entry)] best first."""
+        if self.store is not None:
+            return [(similarity, self._by_id[item_id])
+                    for item_id, similarity, _ in self.store.search(query, top_k=RECALL_CANDIDATES)
+                    if item_id in self._by_id]
+        return sorted(((embeddings.cosine(query, e["vector"]), e) for e in self.entries),
+                      key=lambda pair: pair[0], reverse=True)
+
+    def _load(self):
+        entries = {}
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    # Vectors from a different embedding backend are not comparable
+                    if entry.get("backend") == self.backend:
+                        entries[entry["input"].strip().lower()] = entry
+        return list(entries.values())
+
     def recall_plan(self, user_input: str):
-        # TODO: implement semantic search over past plans
+        if not self.entries:
+            return None
+        query = embeddings.embed_text(user_input)
+        for similarity, entry in self._ranked(query):
+            if similarity < self.threshold:
+                break
+            if all(hook(user_input, entry) for hook in self.verify):
+                print(f"[Recaller] Matched stored request {entry['input']!r} "
+                      f"(similarity {similarity:.3f}).")
+                return entry["plan"]
         return None
 
+    def remember_plan(self, user_input: str, plan):
+        entry = {
+            "input": user_input,
+            "plan": plan,
+            "vector": embeddings.embed_text(user_input),
+            "backend": self.backend,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with open(self.cache_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        key = user_input.strip().lower()
+        self.entries = [e for e in self.entries if e["input"].strip().lower() != key] + [entry]
+        if self.store is not None:
+            item_id = self._entry_id(user_input)
+            self._by_id[item_id] = entry
+            if item_id not in self.store:
+                self.store.add([item_id], [entry["vector"]])
+
+    def record_execution(self, user_input: str, plan, results):
+        """Store *plan* for future recall if every step succeeded."""
+        if plan_succeeded(results):
+            self.remember_plan(user_input, plan)
+            return True
+        return False
+
 executor = Executor()
 recaller = MemoryRecaller()
 LOG_FILE = "gpt_transcripts.jsonl"
@@ -79,7 +227,8 @@ def run_planner(user_input):
     plan = ask_gpt_for_plan(user_input)
     if plan:
         print("[Planner] Executing GPT-generated plan...")
-        execute_plan(plan)
+        results = execute_plan(plan)
+        recaller.record_execution(user_input, plan, results)
     else:
         print("[Planner] GPT did not return a valid plan.")
 
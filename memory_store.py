@@ -0,0 +1,235 @@
+# memory_store.py
+"""
+Append-only, deduplicated storage engine behind MemoryArchiver.
+
+Entries live in a JSONL operation log (``memory_archive.jsonl``):
+
+    {"op": "put", "key": ..., "entry": {...}}          first time an entry is seen
+    {"op": "hit", "key": ..., "last_seen": "..."}      the same entry was archived again
+    {"op": "recall", "keys": [...], "at": "..."}       entries returned by a memory search
+    {"op": "del", "key": ...}                          entry merged or evicted by compaction
+
+The key is a hash of the entry type, the command (or file path) and a
+normalized copy of its output, so re-archiving the same successful command
+bumps ``hit_count`` / ``last_seen`` instead of storing a duplicate.  Each
+archive run appends only its own lines.  When "hit" lines pile up, the log is
+compacted in a background thread (one "put" per live entry, swapped in with
+an atomic rename).
+
+An old pretty-printed ``memory_archive.json`` is imported once on first use.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+# === CONFIG ===
+COMPACT_MIN_LINES = 1000   # don't bother compacting tiny logs
+COMPACT_RATIO = 1.0        # compact once stale lines exceed this many times the live entries
+
+_ANSI = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?")
+_HEX_ID = re.compile(r"0x[0-9a-fA-F]+")
+_WS = re.compile(r"\s+")
+
+
+def normalize_output(text: str) -> str:
+    text = _ANSI.sub("", text or "")
+    text = _TIMESTAMP.sub("<ts>", text)
+    text = _HEX_ID.sub("<hex>", text)
+    return _WS.sub(" ", text).strip().lower()
+
+
+def entry_key(entry: dict) -> str:
+    if entry.get("type") == "shell":
+        target = entry.get("command")
+    elif entry.get("type") == "file":
+        target = entry.get("file")
+    else:  # notes and compaction summaries are keyed by their text
+        target = entry.get("summary") or entry.get("text")
+    raw = "\x1f".join([entry.get("type", ""), (target or "").strip(),
+                       normalize_output(entry.get("output", ""))])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def iter_log_entries(log_path):
+    """
+    Stream the unique entries of a store log without keeping them in memory
+    (hit counts are not applied).  Used by the trainer.  A first pass replays
+    the put/del ops in order, as MemoryStore does, and remembers only the line
+    of each key's live "put"; the second pass yields the entries on those lines.
+    """
+    live = {}   # key -> line number of the put that is currently live
+    with open(log_path, "r") as f:
+        for lineno, line in enumerate(f):
+            if '"put"' not in line and '"del"' not in line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("op") == "put":
+                live.setdefault(record["key"], lineno)
+            elif record.get("op") == "del":
+                live.pop(record["key"], None)
+    wanted = set(live.values())
+    with open(log_path, "r") as f:
+        for lineno, line in enumerate(f):
+            if lineno in wanted:
+                yield json.loads(line)["entry"]
+
+
+class MemoryStore:
+    def __init__(self, log_path, legacy_path=None, background_compaction=True):
+        self.log_path = log_path
+        self.background_compaction = background_compaction
+        self.entries = {}          # key -> entry, in first-seen order
+        self._lines = 0
+        self._lock = threading.Lock()
+        self._compactor = None
+
+        if os.path.exists(log_path):
+            self._replay()
+        elif legacy_path and os.path.exists(legacy_path):
+            self._import_legacy(legacy_path)
+
+    # ---- loading ---------------------------------------------------------- #
+    def _replay(self):
+        with open(self.log_path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line after a crash
+                self._lines += 1
+                if record["op"] == "recall":
+                    self._apply_recall(record["keys"], record["at"])
+                    continue
+                key = record["key"]
+                if record["op"] == "put":
+                    self.entries.setdefault(key, record["entry"])
+                elif record["op"] == "del":
+                    self.entries.pop(key, None)
+                elif record["op"] == "hit" and key in self.entries:
+                    entry = self.entries[key]
+                    entry["hit_count"] = entry.get("hit_count", 1) + 1
+                    entry["last_seen"] = record["last_seen"]
+
+    def _import_legacy(self, legacy_path):
+        with open(legacy_path, "r") as f:
+            legacy = json.load(f)
+        self.add_many(legacy)
+        print(f"[MemoryStore] Imported {len(legacy)} entries from {legacy_path} "
+              f"({len(self.entries)} unique).")
+
+    # ---- writing ---------------------------------------------------------- #
+    def add_many(self, entries):
+        """
+        Archive *entries*; returns the list of entries that were new.
+        Duplicates only bump hit_count / last_seen.
+        """
+        new, lines = [], []
+        with self._lock:
+            for entry in entries:
+                key = entry_key(entry)
+                seen_at = entry.get("timestamp")
+                if key in self.entries:
+                    existing = self.entries[key]
+                    existing["hit_count"] = existing.get("hit_count", 1) + 1
+                    existing["last_seen"] = seen_at
+                    lines.append({"op": "hit", "key": key, "last_seen": seen_at})
+                else:
+                    entry = dict(entry, hit_count=entry.get("hit_count", 1),
+                                 last_seen=entry.get("last_seen", seen_at))
+                    self.entries[key] = entry
+                    new.append(entry)
+                    lines.append({"op": "put", "key": key, "entry": entry})
+            if lines:
+                with open(self.log_path, "a") as f:
+                    f.write("".join(json.dumps(line) + "\n" for line in lines))
+                self._lines += len(lines)
+        self._maybe_compact()
+        return new
+
+    def _apply_recall(self, keys, at):
+        for key in keys:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry["recall_count"] = entry.get("recall_count", 0) + 1
+                entry["last_recalled"] = at
+
+    def record_recall(self, keys, at):
+        """Note that the entries under *keys* were returned by a search."""
+        keys = [key for key in keys if key in self.entries]
+        if not keys:
+            return
+        with self._lock:
+            self._apply_recall(keys, at)
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps({"op": "recall", "keys": keys, "at": at}) + "\n")
+            self._lines += 1
+        self._maybe_compact()
+
+    def replace(self, remove_keys, new_entries=()):
+        """
+        Delete the entries under *remove_keys* and add *new_entries* in one
+        append (used by memory compaction to merge or evict entries).
+        """
+        lines = []
+        with self._lock:
+            for key in remove_keys:
+                if self.entries.pop(key, None) is not None:
+                    lines.append({"op": "del", "key": key})
+            for entry in new_entries:
+                key = entry_key(entry)
+                if key not in self.entries:
+                    self.entries[key] = entry
+                    lines.append({"op": "put", "key": key, "entry": entry})
+            if lines:
+                with open(self.log_path, "a") as f:
+                    f.write("".join(json.dumps(line) + "\n" for line in lines))
+                self._lines += len(lines)
+        self._maybe_compact()
+
+    # ---- compaction ------------------------------------------------------- #
+    def _needs_compaction(self):
+        stale = self._lines - len(self.entries)
+        return self._lines >= COMPACT_MIN_LINES and stale > len(self.entries) * COMPACT_RATIO
+
+    def _maybe_compact(self):
+        if not self._needs_compaction():
+            return
+        if not self.background_compaction:
+            self.compact()
+        elif self._compactor is None or not self._compactor.is_alive():
+            self._compactor = threading.Thread(target=self.compact, daemon=True)
+            self._compactor.start()
+
+    def compact(self):
+        """Rewrite the log as one "put" per live entry (atomic rename)."""
+        with self._lock:
+            tmp_path = self.log_path + ".compact"
+            with open(tmp_path, "w") as f:
+                for key, entry in self.entries.items():
+                    f.write(json.dumps({"op": "put", "key": key, "entry": entry}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.log_path)
+            self._lines = len(self.entries)
+
+    def wait_for_compaction(self):
+        if self._compactor is not None:
+            self._compactor.join()
+
+    # ---- reading ---------------------------------------------------------- #
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(list(self.entries.values()))
+
+    def items(self):
+        with self._lock:
+            return list(self.entries.items())
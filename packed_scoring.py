@@ -0,0 +1,122 @@
+# packed_scoring.py
+"""
+Shared helpers for packed scoring prompts.
+
+Instead of paying the instruction boilerplate (and prompt prefill) once per
+example, the filters can put K instruction-response pairs into one prompt and
+ask for a JSON array with one entry per example.  K is chosen per model so the
+packed prompt plus the expected reply fits the model's context window.
+Slots that come back malformed are returned as None so the caller can fall
+back to its normal per-example call for just those examples.
+"""
+
+import json
+import math
+
+# === CONFIG ===
+# Context windows (in tokens) of the local models used by the filters.
+MODEL_CONTEXT_TOKENS = {
+    "Mistral Instruct": 8192,
+    "Reasoner v1": 8192,
+    "Llama 3.1 8B Instruct 128k": 131072,
+    "llama3:8b": 8192,
+}
+DEFAULT_CONTEXT_TOKENS = 4096
+CONTEXT_SAFETY_MARGIN = 0.8   # use only this fraction of the window
+MAX_PACK_SIZE = 16            # never pack more than this, however large the window
+PACK_WINDOW = 64              # examples read from the input per packing round
+CHARS_PER_TOKEN = 4           # rough estimate; local models use varied tokenizers
+PACKED_VERSION_SUFFIX = "-packed"
+
+
+def ledger_version(prompt_version: str, packed: bool) -> str:
+    """
+    Prompt version to key ledger verdicts with.  Packed verdicts come from a
+    different prompt, so they never stand in for per-example ones (or vice
+    versa) when a resumed run switches mode.
+    """
+    return prompt_version + PACKED_VERSION_SUFFIX if packed else prompt_version
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def context_tokens(model: str) -> int:
+    return MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+
+
+def plan_packs(pairs, model, overhead_tokens, reply_tokens_per_item, max_pack=MAX_PACK_SIZE):
+    """
+    Split the indices of *pairs* (instruction, response) into packs whose
+    estimated prompt + reply size fits the context window of *model*.
+    An example too large to share a prompt ends up in a pack of its own.
+    """
+    budget = int(context_tokens(model) * CONTEXT_SAFETY_MARGIN) - overhead_tokens
+    packs, current, used = [], [], 0
+    for i, (instruction, response) in enumerate(pairs):
+        cost = estimate_tokens(instruction) + estimate_tokens(response) + reply_tokens_per_item
+        if current and (used + cost > budget or len(current) >= max_pack):
+            packs.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+
+def plan_shared_packs(pairs, models, overhead_tokens, reply_tokens_per_item, max_pack=MAX_PACK_SIZE):
+    """plan_packs() for a pack every model in *models* will see: sized to the smallest window."""
+    tightest = min(models, key=context_tokens)
+    return plan_packs(pairs, tightest, overhead_tokens, reply_tokens_per_item, max_pack)
+
+
+def format_examples(pairs) -> str:
+    blocks = []
+    for n, (instruction, response) in enumerate(pairs, 1):
+        blocks.append(f"### Example {n}\nInstruction:\n{instruction}\n\nResponse:\n{response}\n")
+    return "\n".join(blocks)
+
+
+def parse_json_array(reply: str):
+    """Return the outermost JSON array in *reply*, or None."""
+    start, end = reply.find("["), reply.rfind("]")
+    if start == -1 or end <= start:
+        return None
+    try:
+        value = json.loads(reply[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, list) else None
+
+
+def valid_score(value):
+    """Validator for 1-10 score slots: numbers are clamped, anything else is malformed."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        return None
+    return min(max(int(value), 1), 10)
+
+
+def unpack_slots(reply: str, count: int, validate):
+    """
+    Parse a packed reply into *count* validated values.
+    *validate* maps one raw array element to a value or None.  If the array
+    has the wrong length the alignment cannot be trusted, so every slot is None.
+    """
+    values = parse_json_array(reply)
+    if values is None or len(values) != count:
+        return [None] * count
+    return [validate(v) for v in values]
+
+
+def iter_windows(infile, size):
+    """Yield lists of up to *size* parsed JSONL examples from *infile*."""
+    window = []
+    for line in infile:
+        window.append(json.loads(line))
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
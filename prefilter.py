@@ -0,0 +1,158 @@
+# prefilter.py
+"""
+Cheap, deterministic checks that run ahead of the LLM judges in
+training_filter, debate_filter and debate_filter_extended.
+
+A cascade is an ordered list of stages.  Each stage looks at one example and
+returns ("reject", reason), ("accept", reason) or None when it cannot decide.
+The first decisive stage wins; examples no stage decides on are "ambiguous"
+and go on to the model calls.  Per-stage counts are kept so we can see how
+much LLM load each check removes.
+"""
+
+import ast
+import json
+import re
+
+# === CONFIG ===
+DEFAULT_CONFIG = {
+    "min_response_chars": 2,
+    "max_response_chars": 20_000,
+    "min_instruction_chars": 3,
+    # Matched only at the very start of the response, i.e. when the response
+    # *is* raw tool output; answers that mention or quote an error pass.
+    "error_markers": [
+        r"\[ShellError\]",
+        r"\[Error[^\]]*\]",
+        r"\[ERROR[^\]]*\]",
+        r"Traceback \(most recent call last\):",
+        r"\S+:(?: line \d+:)?(?: \S+:)? command not found",
+    ],
+    "max_bad_char_ratio": 0.01,     # control / U+FFFD characters in the response
+    "min_latin_ratio": None,        # e.g. 0.8 to reject mostly non-Latin text
+    "accept_sources": [],           # metadata.source values trusted without a judge
+}
+
+ACCEPT_SCORE = 10  # score given to examples a stage accepts outright
+
+_COUNTER = {"accept": "accepted", "reject": "rejected"}
+_FENCE = re.compile(r"```(?:python|py)\s*\n(.*?)```", re.S)
+_ASKS_JSON = re.compile(r"\bjson\b", re.I)
+# A JSON object opening with a key, or an array opening with an object, array
+# or string element.  Shell like "[ -f x ] && ..." or "{ cmd; }" does not match.
+_LOOKS_JSON = re.compile(r'\{\s*(?:\}|"(?:[^"\\]|\\.)*"\s*:)'
+                         r'|\[\s*(?:\]|[{\[]|"(?:[^"\\]|\\.)*"\s*[,\]])')
+
+
+# === STAGES ===
+def check_length(example, cfg):
+    instruction = example.get("instruction") or ""
+    response = example.get("response") or ""
+    if not response.strip():
+        return "reject", "empty response"
+    if len(instruction.strip()) < cfg["min_instruction_chars"]:
+        return "reject", "instruction too short"
+    if len(response) < cfg["min_response_chars"]:
+        return "reject", "response too short"
+    if len(response) > cfg["max_response_chars"]:
+        return "reject", "response too long"
+    return None
+
+
+def check_error_markers(example, cfg):
+    response = example["response"].lstrip()
+    for pattern in cfg["_error_res"]:
+        if pattern.match(response):
+            return "reject", f"error marker: {pattern.pattern}"
+    return None
+
+
+def check_parseable(example, cfg):
+    response = example["response"].strip()
+    wants_json = _ASKS_JSON.search(example.get("instruction") or "")
+    if response[:1] in ("{", "[") and (wants_json or _LOOKS_JSON.match(response)):
+        try:
+            json.loads(response)
+        except json.JSONDecodeError:
+            return "reject", "truncated or invalid JSON"
+    for block in _FENCE.findall(response):
+        try:
+            ast.parse(block)
+        except SyntaxError:
+            return "reject", "python code block does not parse"
+    return None
+
+
+def check_charset(example, cfg):
+    response = example["response"]
+    if not response:
+        return None
+    bad = sum(1 for c in response if c == "\ufffd" or (ord(c) < 32 and c not in "\n\r\t"))
+    if bad / len(response) > cfg["max_bad_char_ratio"]:
+        return "reject", "garbled characters"
+    if cfg["min_latin_ratio"] is not None:
+        letters = [c for c in response if c.isalpha()]
+        if letters and sum(c.isascii() for c in letters) / len(letters) < cfg["min_latin_ratio"]:
+            return "reject", "unexpected language/script"
+    return None
+
+
+def check_trusted_source(example, cfg):
+    source = (example.get("metadata") or {}).get("source")
+    if source and source in cfg["accept_sources"]:
+        return "accept", f"trusted source: {source}"
+    return None
+
+
+DEFAULT_STAGES = [
+    ("length", check_length),
+    ("error_markers", check_error_markers),
+    ("parseable", check_parseable),
+    ("charset", check_charset),
+    ("trusted_source", check_trusted_source),
+]
+
+
+def resolve(prefilter):
+    """
+    Accept True (default cascade), False/None (disabled) or a PrefilterCascade.
+    The filters default to False: a cascade rejects or accepts some examples
+    without a judge, which changes their output, so it is opt-in.
+    """
+    if prefilter is True:
+        return PrefilterCascade()
+    return prefilter or None
+
+
+class PrefilterCascade:
+    """Runs the stages in order and keeps per-stage pass statistics."""
+    def __init__(self, stages=None, **overrides):
+        self.stages = list(stages or DEFAULT_STAGES)
+        self.config = dict(DEFAULT_CONFIG, **overrides)
+        self.config["_error_res"] = [re.compile(p) for p in self.config["error_markers"]]
+        self.stats = {name: {"seen": 0, "accepted": 0, "rejected": 0} for name, _ in self.stages}
+        self.ambiguous = 0
+
+    def classify(self, example):
+        """Return (decision, stage, reason); decision is None for ambiguous examples."""
+        for name, stage in self.stages:
+            self.stats[name]["seen"] += 1
+            verdict = stage(example, self.config)
+            if verdict is not None:
+                decision, reason = verdict
+                self.stats[name][_COUNTER[decision]] += 1
+                return decision, name, reason
+        self.ambiguous += 1
+        return None, None, None
+
+    def report(self, tag="Prefilter"):
+        total = self.stats[self.stages[0][0]]["seen"] if self.stages else 0
+        for name, _ in self.stages:
+            s = self.stats[name]
+            passed = s["seen"] - s["accepted"] - s["rejected"]
+            rate = passed / s["seen"] if s["seen"] else 1.0
+            print(f"[{tag}] {name:<15} seen {s['seen']:>7}  rejected {s['rejected']:>6}  "
+                  f"accepted {s['accepted']:>6}  pass rate {rate:.1%}")
+        if total:
+            print(f"[{tag}] {self.ambiguous}/{total} examples sent to the LLM judges "
+                  f"({1 - self.ambiguous / total:.1%} of model load avoided)")
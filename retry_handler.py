@@ -1,6 +1,6 @@
 import os
 import json
-from executor import Executor
+from executor import Executor, latest_session_log, load_session_log
 from gpt_planner import ask_gpt_for_plan, execute_plan
 from feedback_logger import FeedbackLogger
 
@@ -15,12 +15,8 @@ class RetryHandler:
         self.log_dir = log_dir
 
     def _load_latest_log(self):
-        logs = [f for f in os.listdir(self.log_dir) if f.endswith(".json")]
-        if not logs:
-            return []
-        latest = max(logs, key=lambda x: os.path.getmtime(os.path.join(self.log_dir, x)))
-        with open(os.path.join(self.log_dir, latest), "r") as f:
-            return json.load(f)
+        latest = latest_session_log(self.log_dir)
+        return load_session_log(latest) if latest else []
 
     def find_failures(self):
         log = self._load_latest_log()
@@ -0,0 +1,186 @@
+# shell_runner.py
+"""
+Streaming shell execution with timeouts and bounded output.
+
+run_command_async() starts the command in its own process group and reads
+stdout and stderr line by line as they are produced, handing each line to
+optional callbacks (lines longer than READ_LIMIT arrive in pieces).  Only
+a head and a tail window of each stream are retained, so a chatty command
+cannot grow memory without bound.  When the wall-clock timeout expires,
+the whole process group gets SIGTERM, then SIGKILL after a grace period,
+so children of the shell die too.
+
+The result dict records stdout/stderr (windowed), code, duration,
+timed_out and the total bytes seen per stream.  run_command() is the
+blocking wrapper used by Executor.run_shell and tool_call_router.run_shell.
+"""
+
+import asyncio
+import os
+import signal
+import threading
+import time
+from collections import deque
+
+# === CONFIG ===
+DEFAULT_TIMEOUT = 600.0      # seconds; None disables the timeout
+KILL_GRACE = 3.0             # seconds between SIGTERM and SIGKILL
+PIPE_GRACE = 1.0             # seconds to drain output after the shell exits
+EXIT_POLL = 0.05             # seconds between checks for the shell's exit
+HEAD_BYTES = 32 * 1024       # kept from the start of each stream
+TAIL_BYTES = 32 * 1024       # kept from the end of each stream
+READ_LIMIT = 1 << 20         # longest line read in one piece
+TIMEOUT_EXIT_CODE = 124      # same convention as coreutils timeout(1)
+
+
+class OutputWindow:
+    """Keeps the first HEAD_BYTES and the last TAIL_BYTES of a stream."""
+    def __init__(self, head_bytes=HEAD_BYTES, tail_bytes=TAIL_BYTES):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = []
+        self.head_size = 0
+        self.tail = deque()
+        self.tail_size = 0
+        self.total = 0
+
+    def add(self, data: bytes):
+        self.total += len(data)
+        if self.head_size < self.head_bytes:
+            take = data[:self.head_bytes - self.head_size]
+            self.head.append(take)
+            self.head_size += len(take)
+            data = data[len(take):]
+            if not data:
+                return
+        self.tail.append(data)
+        self.tail_size += len(data)
+        while self.tail and self.tail_size - len(self.tail[0]) >= self.tail_bytes:
+            self.tail_size -= len(self.tail.popleft())
+
+    @property
+    def omitted(self) -> int:
+        return self.total - self.head_size - self.tail_size
+
+    def text(self) -> str:
+        head = b"".join(self.head).decode("utf-8", errors="replace")
+        tail = b"".join(self.tail)
+        if self.omitted > 0:
+            tail = tail[-self.tail_bytes:]
+            marker = f"\n[... {self.total - self.head_size - len(tail)} bytes omitted ...]\n"
+            return head + marker + tail.decode("utf-8", errors="replace")
+        return head + tail.decode("utf-8", errors="replace")
+
+
+async def _pump(stream, window, callback, name):
+    while True:
+        try:
+            line = await stream.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            line = e.partial                       # EOF; last line has no newline
+        except asyncio.LimitOverrunError as e:
+            # Over-long line: the buffer is left intact, so take the part
+            # that fits and carry on with the rest on the next read
+            line = await stream.readexactly(e.consumed)
+        if not line:
+            return
+        window.add(line)
+        if callback is not None:
+            callback(name, line.decode("utf-8", errors="replace"))
+
+
+async def _exited(proc):
+    """
+    Wait for the shell itself to exit.  proc.wait() also waits for the pipes
+    to close (on 3.11 and earlier), which a background child can put off
+    indefinitely; returncode is set as soon as the process is reaped.
+    """
+    while proc.returncode is None:
+        await asyncio.sleep(EXIT_POLL)
+    return proc.returncode
+
+
+def _kill_group(proc, sig):
+    try:
+        os.killpg(proc.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def run_command_async(command, cwd=None, timeout=DEFAULT_TIMEOUT, on_output=None,
+                            merge_stderr=False, head_bytes=HEAD_BYTES, tail_bytes=TAIL_BYTES):
+    """
+    Run *command* through the shell.  on_output(stream_name, line) is called
+    for every line as it arrives.  With merge_stderr, stderr is interleaved
+    into stdout (like stderr=STDOUT).
+    """
+    start = time.monotonic()
+    proc = await asyncio.create_subprocess_shell(
+        command, cwd=cwd, limit=READ_LIMIT, start_new_session=True,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT if merge_stderr else asyncio.subprocess.PIPE)
+    out, err = OutputWindow(head_bytes, tail_bytes), OutputWindow(head_bytes, tail_bytes)
+    pumps = [asyncio.ensure_future(_pump(proc.stdout, out, on_output, "stdout"))]
+    if not merge_stderr:
+        pumps.append(asyncio.ensure_future(_pump(proc.stderr, err, on_output, "stderr")))
+
+    timed_out = False
+    try:
+        await asyncio.wait_for(_exited(proc), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        _kill_group(proc, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(_exited(proc), KILL_GRACE)
+        except asyncio.TimeoutError:
+            _kill_group(proc, signal.SIGKILL)
+            await _exited(proc)
+
+    # The shell has exited, but a background child ("server &") may still
+    # hold the pipes open: drain briefly, then stop reading.  The exit code
+    # is the shell's own.
+    _, pending = await asyncio.wait(pumps, timeout=PIPE_GRACE)
+    for pump in pending:
+        pump.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    # Close the pipe transports now, while the loop is still running;
+    # otherwise their __del__ runs after asyncio.run() has closed the loop
+    transport = getattr(proc, "_transport", None)
+    if transport is not None:
+        transport.close()
+
+    stderr = err.text()
+    if timed_out:
+        stderr += f"\n[Timed out after {timeout:g}s; process group killed]"
+    return {
+        "stdout": out.text(),
+        "stderr": stderr,
+        "code": TIMEOUT_EXIT_CODE if timed_out else proc.returncode,
+        "duration": round(time.monotonic() - start, 3),
+        "timed_out": timed_out,
+        "stdout_total_bytes": out.total,
+        "stderr_total_bytes": err.total,
+    }
+
+
+def run_command(command, **kwargs):
+    """Blocking wrapper; safe to call from inside a running event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(run_command_async(command, **kwargs))
+    # Called from async code: run on a helper thread with its own loop
+    box = {}
+
+    def target():
+        try:
+            box["result"] = asyncio.run(run_command_async(command, **kwargs))
+        except BaseException as e:
+            box["error"] = e
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if "error" in box:
+        raise box["error"]
+    return box["result"]
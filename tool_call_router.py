@@ -1,6 +1,6 @@
 import os
-import subprocess
 from goal_manager   import log_goals, get_goals
+from shell_runner   import DEFAULT_TIMEOUT, run_command
 
 # your LocalDocs-backed retrievers
 from local_retriever import search_local_files, read_file, search_localdocs
@@ -11,14 +11,21 @@ def write_file(filepath: str, content: str):
         f.write(content)
     print(f"[FileWriter] Wrote to {filepath}")
 
-def run_shell(command: str) -> str:
+def run_shell(command: str, timeout: float = DEFAULT_TIMEOUT, on_output=None) -> str:
+    """
+    Run a shell command; output is head/tail-capped and the command is killed
+    on timeout.  on_output(stream, line) sees each line as it is produced.
+    """
     try:
-        output = subprocess.check_output(
-            command, shell=True, stderr=subprocess.STDOUT
-        )
-        return output.decode()
-    except subprocess.CalledProcessError as e:
-        return f"[ShellError] {e.output.decode()}"
+        result = run_command(command, timeout=timeout, on_output=on_output, merge_stderr=True)
+    except Exception as e:
+        return f"[ShellError] {e}"
+    print(f"[Shell] Exit code {result['code']} after {result['duration']}s: {command}")
+    if result["timed_out"]:
+        return f"[ShellError] Timed out after {result['duration']}s\n{result['stdout']}"
+    if result["code"] != 0:
+        return f"[ShellError] Exit code {result['code']}\n{result['stdout']}"
+    return result["stdout"]
 
 # Registry of all tools your agent can call
 AGENT = {
@@ -1,52 +1,98 @@
 import os
 import json
 import random
+import hashlib
+import argparse
+import tempfile
 from datetime import datetime
+from dedup import dedupe_stream
+from memory_store import iter_log_entries
 
 TRANSCRIPT_FILE = "gpt_transcripts.jsonl"
 ARCHIVE_FILE = "memory_archive.json"
+ARCHIVE_LOG = os.path.splitext(ARCHIVE_FILE)[0] + ".jsonl"  # MemoryStore log
 OUTPUT_FILE = "training_data.jsonl"
 
+# === Streaming mode ===
+SHARD_DIR = "training_shards"
+SHARD_PREFIX = "training_data"
+SHARD_MAX_BYTES = 64 * 1024 * 1024
+SHUFFLE_BUCKETS = 64
+READ_CHUNK = 1 << 16
+
 # === Load Transcripts ===
-def load_transcripts():
-    print("[Trainer] Loading GPT transcripts...")
-    data = []
+def iter_transcripts():
     with open(TRANSCRIPT_FILE, "r") as f:
         for line in f:
             entry = json.loads(line)
             if entry.get("prompt") and entry.get("response"):
-                data.append({
+                yield {
                     "instruction": entry["prompt"].strip(),
                     "response": entry["response"].strip(),
                     "source": "gpt"
-                })
-    return data
+                }
+
+def load_transcripts():
+    print("[Trainer] Loading GPT transcripts...")
+    return list(iter_transcripts())
 
 # === Load Memory ===
-def load_memory():
-    print("[Trainer] Loading archived memory...")
-    if not os.path.exists(ARCHIVE_FILE):
-        return []
-    with open(ARCHIVE_FILE, "r") as f:
-        memory = json.load(f)
-    entries = []
-    for item in memory:
+def _iter_json_array(path):
+    """Yield the items of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, "r") as f:
+        buf = f.read(READ_CHUNK).lstrip()
+        if not buf.startswith("["):
+            raise ValueError(f"{path} is not a JSON array")
+        buf, eof = buf[1:], False
+        while True:
+            buf = buf.lstrip().lstrip(",").lstrip()
+            if buf.startswith("]"):
+                return
+            try:
+                item, end = decoder.raw_decode(buf)
+                # A value that ends exactly at the buffer end may be cut short
+                # (e.g. the number 12 of 123); read more before trusting it
+                if end == len(buf) and not eof:
+                    raise json.JSONDecodeError("item may continue in next chunk", buf, end)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(READ_CHUNK)
+                eof = not chunk
+                buf += chunk
+                continue
+            yield item
+            buf = buf[end:]
+
+def _iter_archive():
+    if os.path.exists(ARCHIVE_LOG):
+        yield from iter_log_entries(ARCHIVE_LOG)
+    elif os.path.exists(ARCHIVE_FILE):
+        # Archive not migrated to the MemoryStore log yet
+        yield from _iter_json_array(ARCHIVE_FILE)
+
+def iter_memory():
+    for item in _iter_archive():
         if item["type"] == "shell":
-            entries.append({
+            yield {
                 "instruction": f"Execute shell command for: {item['summary']}",
                 "response": item["command"],
                 "source": "memory"
-            })
+            }
         elif item["type"] == "file":
-            entries.append({
+            yield {
                 "instruction": f"Create or patch file '{item['file']}' for: {item['summary']}",
                 "response": item["content"],
                 "source": "memory"
-            })
-    return entries
+            }
+
+def load_memory():
+    print("[Trainer] Loading archived memory...")
+    return list(iter_memory())
 
 # === Main Conversion ===
-def generate_training_data():
+def generate_training_data(dedupe=True):
     print("[Trainer] Generating training dataset...")
     transcripts = load_transcripts()
     memory_data = load_memory()
@@ -54,12 +100,17 @@ def generate_training_data():
     all_data = transcripts + memory_data
     print(f"[Trainer] Loaded {len(all_data)} total examples.")
 
+    # Drop exact and near duplicates before anything gets scored downstream
+    if dedupe:
+        all_data = list(dedupe_stream(all_data))
+
     # Shuffle + tag
     random.shuffle(all_data)
     for d in all_data:
         d["metadata"] = {
             "timestamp": datetime.now().isoformat(),
-            "source": d.pop("source")
+            "source": d.pop("source"),
+            "cluster_size": d.pop("cluster_size", 1)
         }
 
     with open(OUTPUT_FILE, "w") as f:
@@ -68,5 +119,113 @@ def generate_training_data():
 
     print(f"[Trainer] Wrote dataset to: {OUTPUT_FILE}")
 
+# === Streaming Conversion ===
+def external_shuffle(lines, rng, buckets=SHUFFLE_BUCKETS, work_dir=None):
+    """
+    Disk-backed shuffle of an iterable of text lines.
+    Each line goes to a random bucket file; buckets are then loaded one at a
+    time, shuffled in memory and emitted.  Peak memory is about one bucket.
+    """
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        paths = [os.path.join(tmp, f"bucket_{i:04d}.jsonl") for i in range(buckets)]
+        files = [open(p, "w") for p in paths]
+        try:
+            for line in lines:
+                files[rng.randrange(buckets)].write(line + "\n")
+        finally:
+            for f in files:
+                f.close()
+        for path in paths:
+            with open(path, "r") as f:
+                chunk = f.read().splitlines()
+            rng.shuffle(chunk)
+            yield from chunk
+
+def write_shards(lines, output_dir=SHARD_DIR, max_bytes=SHARD_MAX_BYTES):
+    """Write lines into size-capped JSONL shards; returns the shard descriptors."""
+    os.makedirs(output_dir, exist_ok=True)
+    shards, out, info, hasher = [], None, None, None
+
+    def close_shard():
+        out.close()
+        info["sha256"] = hasher.hexdigest()
+        shards.append(info)
+
+    for line in lines:
+        data = (line + "\n").encode("utf-8")
+        if out is not None and info["bytes"] and info["bytes"] + len(data) > max_bytes:
+            close_shard()
+            out = None
+        if out is None:
+            name = f"{SHARD_PREFIX}-{len(shards):05d}.jsonl"
+            out = open(os.path.join(output_dir, name), "wb")
+            info, hasher = {"file": name, "examples": 0, "bytes": 0}, hashlib.sha256()
+        out.write(data)
+        hasher.update(data)
+        info["examples"] += 1
+        info["bytes"] += len(data)
+    if out is not None:
+        close_shard()
+    # Shards left over from an earlier, larger run would look like part of this one
+    written = {s["file"] for s in shards}
+    for name in os.listdir(output_dir):
+        if name.startswith(SHARD_PREFIX + "-") and name.endswith(".jsonl") and name not in written:
+            os.remove(os.path.join(output_dir, name))
+    return shards
+
+def generate_training_data_streaming(output_dir=SHARD_DIR, seed=0, dedupe=True,
+                                     shard_max_bytes=SHARD_MAX_BYTES, buckets=SHUFFLE_BUCKETS):
+    """
+    Bounded-memory variant of generate_training_data(): reads both sources
+    lazily, shuffles on disk with a seeded RNG and writes size-capped shards
+    plus a manifest.json describing them.
+    """
+    print(f"[Trainer] Streaming dataset generation (seed={seed})...")
+    rng = random.Random(seed)
+    sources = {"gpt": 0, "memory": 0}
+
+    def examples():
+        for stream in (iter_transcripts(), iter_memory()):
+            for d in stream:
+                sources[d["source"]] += 1
+                yield d
+
+    stats = {}
+    stream = dedupe_stream(examples(), stats=stats) if dedupe else examples()
+
+    def tagged_lines():
+        for d in stream:
+            d["metadata"] = {
+                "timestamp": datetime.now().isoformat(),
+                "source": d.pop("source"),
+                "cluster_size": d.pop("cluster_size", 1)
+            }
+            yield json.dumps(d)
+
+    shards = write_shards(external_shuffle(tagged_lines(), rng, buckets), output_dir, shard_max_bytes)
+    manifest = {
+        "created": datetime.now().isoformat(),
+        "seed": seed,
+        "sources": sources,
+        "dedup": stats or None,
+        "examples": sum(s["examples"] for s in shards),
+        "shards": shards
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"[Trainer] Wrote {manifest['examples']} examples in {len(shards)} shards to: {output_dir}")
+    return manifest
+
 if __name__ == "__main__":
-    generate_training_data()
+    parser = argparse.ArgumentParser(description="Build the fine-tuning dataset")
+    parser.add_argument("--stream", action="store_true", help="Bounded-memory sharded output")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shard-mb", type=int, default=SHARD_MAX_BYTES // (1024 * 1024))
+    parser.add_argument("--out-dir", default=SHARD_DIR)
+    args = parser.parse_args()
+
+    if args.stream:
+        generate_training_data_streaming(args.out_dir, seed=args.seed,
+                                         shard_max_bytes=args.shard_mb * 1024 * 1024)
+    else:
+        generate_training_data()
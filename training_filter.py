@@ -2,9 +2,27 @@ import json
 import os
 from datetime import datetime
 from local_llm import call_local_model
+from verdict_ledger import VerdictLedger, example_key
+from prefilter import ACCEPT_SCORE, resolve as resolve_prefilter
+from packed_scoring import (PACK_WINDOW, estimate_tokens, format_examples, iter_windows,
+                            ledger_version, plan_packs, unpack_slots, valid_score)
 
 INPUT_FILE = "training_data.jsonl"
 OUTPUT_FILE = "scored_training_data.jsonl"
+LEDGER_FILE = "training_filter_ledger.jsonl"
+
+# Bump when the scoring prompt changes so old verdicts are not reused.
+PROMPT_VERSION = "score-v1"
+SCORER_MODEL = "llama3:8b"
+SCORER_MODELS = [SCORER_MODEL]
+
+PACKED_PROMPT = """
+Evaluate each of the following {count} instruction-response pairs for quality.
+Score each from 1 to 10 based on correctness, clarity, and usefulness.
+
+{examples}
+Return only a JSON array of {count} integers, one score per example, in order.
+"""
 
 def score_example(example):
     prompt = f"""
@@ -18,28 +36,74 @@ Response:
 
 Score from 1 to 10 based on correctness, clarity, and usefulness. Just return the number.
 """
-    reply = call_local_model(prompt)
+    reply = call_local_model(prompt, SCORER_MODEL)
     try:
         score = int(''.join(c for c in reply if c.isdigit()))
         return min(max(score, 1), 10)
     except:
         return 1
 
-def rank_and_filter_data(input_path, output_path, min_score=6):
+def score_examples_packed(examples):
+    """
+    Score many examples with packed prompts, yielding (index, score) as each
+    pack returns; any slot the model gets wrong is rescored with score_example().
+    """
+    pairs = [(ex["instruction"], ex["response"]) for ex in examples]
+    overhead = estimate_tokens(PACKED_PROMPT)
+    for pack in plan_packs(pairs, SCORER_MODEL, overhead, reply_tokens_per_item=4):
+        scores = [None] * len(pack)
+        if len(pack) > 1:
+            prompt = PACKED_PROMPT.format(count=len(pack),
+                                          examples=format_examples([pairs[i] for i in pack]))
+            reply = call_local_model(prompt, SCORER_MODEL)
+            scores = unpack_slots(reply, len(pack), valid_score)
+        for i, score in zip(pack, scores):
+            yield i, score if score is not None else score_example(examples[i])
+
+def rank_and_filter_data(input_path, output_path, min_score=6, ledger_path=LEDGER_FILE,
+                         packed=False, prefilter=False):
     print(f"[Filter] Reading: {input_path}")
-    passed, skipped = 0, 0
-    with open(input_path, "r") as infile, open(output_path, "w") as outfile:
-        for line in infile:
-            example = json.loads(line)
-            score = score_example(example)
-            example["score"] = score
-            example["metadata"]["scored_at"] = datetime.now().isoformat()
-            if score >= min_score:
-                outfile.write(json.dumps(example) + "\n")
-                passed += 1
+    cascade = resolve_prefilter(prefilter)
+    passed, skipped, cached = 0, 0, 0
+    with open(input_path, "r") as infile, open(output_path, "w") as outfile, \
+         VerdictLedger(ledger_path) as ledger:
+        version = ledger_version(PROMPT_VERSION, packed)
+        for window in iter_windows(infile, PACK_WINDOW if packed else 1):
+            # Clear cases are settled by the prefilter and never reach the model
+            decisions = [cascade.classify(ex) if cascade else (None, None, None) for ex in window]
+            keys = [None if decision else
+                    example_key(ex["instruction"], ex["response"], SCORER_MODELS, version)
+                    for ex, (decision, _, _) in zip(window, decisions)]
+            todo = ledger.pending(keys)
+            cached += sum(1 for key in keys if key) - len(todo)
+            # Each verdict is recorded as soon as its pack returns
+            if packed:
+                for j, score in score_examples_packed([window[i] for i in todo]):
+                    ledger.record(keys[todo[j]], {"score": score})
             else:
-                skipped += 1
-    print(f"[Filter] Saved {passed} high-quality examples, skipped {skipped}.")
+                for i in todo:
+                    ledger.record(keys[i], {"score": score_example(window[i])})
+
+            for example, key, (decision, stage, reason) in zip(window, keys, decisions):
+                if decision == "reject":
+                    skipped += 1
+                    continue
+                if decision == "accept":
+                    score = ACCEPT_SCORE
+                    example["metadata"]["prefilter"] = f"{stage}: {reason}"
+                else:
+                    score = ledger.get(key)["score"]
+                example["score"] = score
+                example["metadata"]["scored_at"] = datetime.now().isoformat()
+                if score >= min_score:
+                    outfile.write(json.dumps(example) + "\n")
+                    passed += 1
+                else:
+                    skipped += 1
+    print(f"[Filter] Saved {passed} high-quality examples, skipped {skipped} "
+          f"({cached} verdicts reused from ledger).")
+    if cascade:
+        cascade.report("Filter")
 
 if __name__ == "__main__":
     if not os.path.exists(INPUT_FILE):
@@ -0,0 +1,111 @@
+# verdict_ledger.py
+"""
+Persistent verdict ledger shared by the filter pipelines
+(training_filter, debate_filter, debate_filter_extended).
+
+Every verdict is appended to a JSONL file the moment it is produced, keyed by
+a hash of instruction + response + model set + prompt version.  A rerun after
+a crash (or a daily rerun over a grown training_data.jsonl) reloads the ledger
+and only scores examples whose key is not in it yet.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+
+def example_key(instruction: str, response: str, models, prompt_version: str) -> str:
+    """Stable content hash for one example under one scoring setup."""
+    hasher = hashlib.sha256()
+    for part in (instruction, response, "\x1f".join(models), prompt_version):
+        hasher.update(part.encode("utf-8"))
+        hasher.update(b"\x1e")
+    return hasher.hexdigest()
+
+
+class VerdictLedger:
+    """
+    Append-only key -> verdict store.
+    The last line of the file may be torn if the process died mid-write;
+    such lines are ignored on load and the example is simply rescored.  The
+    first record() after opening terminates a torn tail with a newline so
+    the new record starts on a line of its own.
+    """
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self.verdicts = self._load()
+        self._fh = None
+
+    def _load(self) -> dict:
+        verdicts = {}
+        if not os.path.exists(self.path):
+            return verdicts
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    verdicts[entry["key"]] = entry["verdict"]
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+        return verdicts
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.verdicts
+
+    def __len__(self) -> int:
+        return len(self.verdicts)
+
+    def pending(self, keys):
+        """
+        Indices into *keys* that still need scoring: the first occurrence of
+        each key that has no verdict yet.  None keys are skipped.
+        """
+        todo, seen = [], set()
+        for i, key in enumerate(keys):
+            if key and key not in self.verdicts and key not in seen:
+                todo.append(i)
+                seen.add(key)
+        return todo
+
+    def get(self, key: str):
+        return self.verdicts.get(key)
+
+    def _ends_torn(self) -> bool:
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return False
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) != b"\n"
+        except OSError:
+            return False
+
+    def record(self, key: str, verdict: dict) -> None:
+        """Persist *verdict* for *key* immediately (later records win on load)."""
+        if self._fh is None:
+            dirname = os.path.dirname(self.path)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            self._fh = open(self.path, "a")
+            if self._ends_torn():
+                self._fh.write("\n")
+        entry = {"key": key, "recorded_at": datetime.now().isoformat(), "verdict": verdict}
+        self._fh.write(json.dumps(entry) + "\n")
+        self._fh.flush()
+        if self.fsync:
+            os.fsync(self._fh.fileno())
+        self.verdicts[key] = verdict
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,21 +1,37 @@
 import os
 import hashlib
 import json
+import sqlite3
+import argparse
 from datetime import datetime
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 
 # === CONFIG ===
 SEARCH_ROOT = os.path.expanduser("~")  # Full home directory
 KEYWORDS = ["loop", "main.py"]
 OUTPUT_FILE = os.path.expanduser("~/Desktop/AGI_in_A_box/version_report.json")
+CATALOG_DB = os.path.expanduser("~/Desktop/AGI_in_A_box/version_catalog.sqlite")
 MAX_PREVIEW_LINES = 15
+HASH_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+# Directories are pruned before descending: by absolute prefix...
+SKIP_PREFIXES = ["/proc", "/sys", "/dev", "/snap"]
+# ...or by name anywhere in the tree
+SKIP_DIR_NAMES = {".cache", ".config", ".local", "snap", ".git", "node_modules",
+                  "__pycache__", ".venv", "venv", ".mypy_cache", ".tox"}
 
 def get_file_hash(filepath):
     hasher = hashlib.sha256()
     with open(filepath, 'rb') as f:
-        while chunk := f.read(8192):
+        while chunk := f.read(1 << 20):
             hasher.update(chunk)
     return hasher.hexdigest()
 
+def read_preview(filepath):
+    # islice stops cleanly on files shorter than MAX_PREVIEW_LINES
+    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+        return ''.join(islice(f, MAX_PREVIEW_LINES))
+
 def is_candidate(filename):
     return (
         filename == "main.py" or
@@ -23,41 +39,218 @@ def is_candidate(filename):
         any(keyword in filename.lower() for keyword in KEYWORDS)
     )
 
-def index_versions():
-    print(f"[Indexer] Scanning from root: {SEARCH_ROOT}")
-    result = []
+def _skip_dir(path, name):
+    return name in SKIP_DIR_NAMES or any(
+        path == p or path.startswith(p + os.sep) for p in SKIP_PREFIXES)
 
-    for dirpath, _, files in os.walk(SEARCH_ROOT):
-        # Skip known system paths
-        if any(skip in dirpath for skip in ["/.cache", "/.config", "/.local", "/snap", "/proc", "/sys", "/dev"]):
+def scan_candidates(root=SEARCH_ROOT):
+    """Yield (path, stat) for candidate .py files, pruning skipped directories in place."""
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError:
             continue
-
-        for fname in files:
-            if not fname.endswith(".py"):
-                continue
-            if not is_candidate(fname):
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not _skip_dir(entry.path, entry.name):
+                        stack.append(entry.path)
+                elif entry.name.endswith(".py") and is_candidate(entry.name) and entry.is_file():
+                    yield entry.path, entry.stat()
+            except OSError:
                 continue
 
-            full_path = os.path.join(dirpath, fname)
-            try:
-                with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    preview = ''.join([next(f) for _ in range(MAX_PREVIEW_LINES)])
-            except Exception as e:
-                preview = f"[Error reading file: {e}]"
-
-            file_stat = os.stat(full_path)
-            result.append({
-                "file": fname,
-                "path": full_path,
-                "size": file_stat.st_size,
-                "modified": datetime.utcfromtimestamp(file_stat.st_mtime).isoformat(),
-                "hash": get_file_hash(full_path),
-                "preview": preview
-            })
-
-    with open(OUTPUT_FILE, "w") as out:
-        json.dump({"version_candidates": result}, out, indent=2)
-    print(f"[Indexer] Done. Report saved to: {OUTPUT_FILE}")
+class VersionCatalog:
+    """
+    SQLite catalog of candidate files.  Doubles as the (path, size, mtime) cache
+    for rescans and records what changed in each scan.
+    """
+    def __init__(self, db_path=CATALOG_DB):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, file TEXT, size INTEGER,
+                                              mtime_ns INTEGER, modified TEXT, hash TEXT,
+                                              preview TEXT, last_scan INTEGER);
+            CREATE INDEX IF NOT EXISTS files_by_hash ON files (hash);
+            CREATE INDEX IF NOT EXISTS files_by_name ON files (file);
+            CREATE INDEX IF NOT EXISTS files_by_mtime ON files (mtime_ns);
+            CREATE TABLE IF NOT EXISTS scans (id INTEGER PRIMARY KEY, root TEXT, started TEXT,
+                                              finished TEXT, files INTEGER, hashed INTEGER);
+            CREATE TABLE IF NOT EXISTS history (scan_id INTEGER, path TEXT, event TEXT,
+                                                old_hash TEXT, new_hash TEXT);
+            CREATE INDEX IF NOT EXISTS history_by_path ON history (path);
+        """)
+
+    def known(self, root):
+        prefix = root.rstrip(os.sep) + os.sep
+        return {path: (size, mtime, file_hash, preview) for path, size, mtime, file_hash, preview in
+                self.db.execute("SELECT path, size, mtime_ns, hash, preview FROM files "
+                                "WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))}
+
+    def record_scan(self, root, started, entries, mtimes, known, hashed):
+        """Store one scan's results and its added/changed/removed events."""
+        with self.db:
+            cur = self.db.execute("INSERT INTO scans (root, started, finished, files, hashed) "
+                                  "VALUES (?, ?, ?, ?, ?)",
+                                  (root, started, datetime.utcnow().isoformat(), len(entries), hashed))
+            scan_id = cur.lastrowid
+            events = []
+            for e in entries:
+                previous = known.pop(e["path"], None)
+                if previous is None:
+                    events.append((scan_id, e["path"], "added", None, e["hash"]))
+                elif previous[2] != e["hash"]:
+                    events.append((scan_id, e["path"], "changed", previous[2], e["hash"]))
+            events += [(scan_id, path, "removed", previous[2], None) for path, previous in known.items()]
+            self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                [(e["path"], e["file"], e["size"], mtimes[e["path"]], e["modified"],
+                                  e["hash"], e["preview"], scan_id) for e in entries])
+            self.db.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in known])
+            self.db.executemany("INSERT INTO history VALUES (?, ?, ?, ?, ?)", events)
+        return scan_id, events
+
+    # ---- queries ---------------------------------------------------------- #
+    def duplicates(self, pattern=None):
+        """[(hash, [paths])] for content shared by more than one path."""
+        sql = "SELECT hash, path FROM files WHERE hash IN (SELECT hash FROM files WHERE hash IS NOT NULL"
+        args = ()
+        if pattern:
+            sql += " AND file GLOB ?"
+            args = (pattern,)
+        sql += " GROUP BY hash HAVING COUNT(*) > 1)"
+        if pattern:
+            sql += " AND file GLOB ?"
+            args += (pattern,)
+        groups = {}
+        for file_hash, path in self.db.execute(sql + " ORDER BY hash, mtime_ns DESC", args):
+            groups.setdefault(file_hash, []).append(path)
+        return list(groups.items())
+
+    def latest(self, pattern="*", under=None, limit=10):
+        """Newest files whose name matches the glob *pattern*, optionally under a directory."""
+        sql, args = "SELECT path, modified, hash FROM files WHERE file GLOB ?", [pattern]
+        if under:
+            prefix = os.path.abspath(os.path.expanduser(under)).rstrip(os.sep) + os.sep
+            sql += " AND substr(path, 1, ?) = ?"
+            args += [len(prefix), prefix]
+        sql += " ORDER BY mtime_ns DESC LIMIT ?"
+        return self.db.execute(sql, args + [limit]).fetchall()
+
+    def history(self, path=None, limit=50):
+        sql = ("SELECT s.finished, h.path, h.event, h.old_hash, h.new_hash FROM history h "
+               "JOIN scans s ON s.id = h.scan_id")
+        args = ()
+        if path:
+            sql += " WHERE h.path = ?"
+            args = (os.path.abspath(os.path.expanduser(path)),)
+        return self.db.execute(sql + " ORDER BY h.scan_id DESC LIMIT ?", args + (limit,)).fetchall()
+
+    def export_json(self, output_file=OUTPUT_FILE, root=None):
+        """Write the JSON report for files under *root* (every root when None)."""
+        sql, args = "SELECT file, path, size, modified, hash, preview FROM files", ()
+        if root:
+            prefix = os.path.abspath(os.path.expanduser(root)).rstrip(os.sep) + os.sep
+            sql += " WHERE substr(path, 1, ?) = ?"
+            args = (len(prefix), prefix)
+        rows = self.db.execute(sql + " ORDER BY path", args)
+        result = [dict(zip(("file", "path", "size", "modified", "hash", "preview"), row)) for row in rows]
+        os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+        with open(output_file, "w") as out:
+            json.dump({"version_candidates": result}, out, indent=2)
+        return len(result)
+
+def _describe(full_path):
+    try:
+        preview = read_preview(full_path)
+    except Exception as e:
+        preview = f"[Error reading file: {e}]"
+    try:
+        file_hash = get_file_hash(full_path)
+    except OSError as e:
+        file_hash = None
+        preview = preview or f"[Error reading file: {e}]"
+    return {"hash": file_hash, "preview": preview}
+
+def index_versions(root=SEARCH_ROOT, output_file=OUTPUT_FILE, db_path=CATALOG_DB, export=True):
+    print(f"[Indexer] Scanning from root: {root}")
+    root = os.path.abspath(root)
+    started = datetime.utcnow().isoformat()
+    catalog = VersionCatalog(db_path)
+    known = catalog.known(root)
+    result, misses, mtimes = [], [], {}
+
+    for full_path, file_stat in scan_candidates(root):
+        entry = {
+            "file": os.path.basename(full_path),
+            "path": full_path,
+            "size": file_stat.st_size,
+            "modified": datetime.utcfromtimestamp(file_stat.st_mtime).isoformat(),
+        }
+        mtimes[full_path] = file_stat.st_mtime_ns
+        cached = known.get(full_path)
+        # Unchanged (size, mtime) means the hash and preview are still valid
+        if cached and cached[0] == file_stat.st_size and cached[1] == file_stat.st_mtime_ns:
+            entry.update(hash=cached[2], preview=cached[3])
+        else:
+            misses.append(entry)
+        result.append(entry)
+
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+        for entry, described in zip(misses, pool.map(lambda e: _describe(e["path"]), misses)):
+            entry.update(described)
+
+    _, events = catalog.record_scan(root, started, result, mtimes, known, len(misses))
+    print(f"[Indexer] Done. {len(result)} candidates ({len(misses)} hashed, "
+          f"{len(result) - len(misses)} cached), {len(events)} changes. Catalog: {db_path}")
+    if export:
+        catalog.export_json(output_file, root)
+        print(f"[Indexer] Report saved to: {output_file}")
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index and query versions of loop/main scripts")
+    parser.add_argument("--db", default=CATALOG_DB)
+    sub = parser.add_subparsers(dest="cmd")
+    scan = sub.add_parser("scan", help="Scan and update the catalog (default)")
+    scan.add_argument("--root", default=SEARCH_ROOT)
+    scan.add_argument("--no-export", action="store_true", help="Skip writing the JSON report")
+    dupes = sub.add_parser("dupes", help="Paths sharing the same content hash")
+    dupes.add_argument("pattern", nargs="?", help="Filename glob, e.g. 'main_loop.py'")
+    latest = sub.add_parser("latest", help="Newest files matching a filename glob")
+    latest.add_argument("pattern", nargs="?", default="*")
+    latest.add_argument("--under", help="Only paths below this directory")
+    latest.add_argument("-n", "--limit", type=int, default=10)
+    hist = sub.add_parser("history", help="Changes recorded between scans")
+    hist.add_argument("path", nargs="?")
+    hist.add_argument("-n", "--limit", type=int, default=50)
+    export = sub.add_parser("export", help="Write the JSON report from the catalog")
+    export.add_argument("--out", default=OUTPUT_FILE)
+    export.add_argument("--root", help="Only files below this directory (default: every scanned root)")
+    args = parser.parse_args(argv)
+
+    if args.cmd in (None, "scan"):
+        index_versions(getattr(args, "root", SEARCH_ROOT), db_path=args.db,
+                       export=not getattr(args, "no_export", False))
+        return
+    catalog = VersionCatalog(args.db)
+    if args.cmd == "dupes":
+        for file_hash, paths in catalog.duplicates(args.pattern):
+            print(f"{file_hash[:12]}  ({len(paths)} copies)")
+            for path in paths:
+                print(f"    {path}")
+    elif args.cmd == "latest":
+        for path, modified, file_hash in catalog.latest(args.pattern, args.under, args.limit):
+            print(f"{modified}  {(file_hash or '-')[:12]}  {path}")
+    elif args.cmd == "history":
+        for when, path, event, old, new in catalog.history(args.path, args.limit):
+            print(f"{when}  {event:<8} {path}  {(old or '-')[:12]} -> {(new or '-')[:12]}")
+    elif args.cmd == "export":
+        count = catalog.export_json(args.out, args.root)
+        print(f"[Indexer] Exported {count} entries to: {args.out}")
 
 if __name__ == "__main__":
-    index_versions()
+    main()